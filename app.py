@@ -9,9 +9,15 @@ from flask_cors import CORS
 import h3
 
 from config import Config
-from utils.database import get_db_collection, get_statistics, get_filters
+from utils.database import get_db_collection, get_cell_rollup_collection, get_od_flow_collection, get_statistics, get_filters
+from utils.clusters import cluster_resolution_for_zoom, rollup_supply_clusters
 from utils.geojson_loader import load_pincode_geojson
 from utils.redis_cache import get_cache, set_cache
+from utils.http_cache import cached_json_response
+from utils.indexes import covering_index_options, verify_pipeline_indexes
+from utils.pipelines import (
+    build_match_conditions, hexagons_pipeline, supply_points_pipeline, supply_clusters_pipeline
+)
 from threading import Thread
 
 logging.basicConfig(
@@ -48,6 +54,12 @@ def initialize_app():
 
         indexes = collection.index_information()
         logger.info(f"Indexes configured: {len(indexes)}")
+        if Config.VERIFY_INDEXES_ON_STARTUP and doc_count > 0:
+            problems = verify_pipeline_indexes(collection)
+            if problems:
+                logger.warning(f"{len(problems)} pipelines are not served by covering indexes — run: python scripts/check_indexes.py")
+            else:
+                logger.info("Index check passed: all pipelines use covering index scans")
 
         logger.info("Loading pincode GeoJSON boundaries...")
         pincode_geojson = load_pincode_geojson()
@@ -86,69 +98,17 @@ def get_hexagons_with_filters(logistics_player='All', hour_bin='All', limit=None
         logger.info(f"❌ Cache miss for key: {cache_key} — querying MongoDB")
     
     collection = get_db_collection()
-    pipeline = []
     
     # Stage 1: Filter by player and hour
-    match_conditions = {}
-    if logistics_player != 'All':
-        match_conditions['logistics_player'] = logistics_player
-    if hour_bin != 'All':
-        match_conditions['hour_bin'] = hour_bin
-    
+    match_conditions = build_match_conditions(logistics_player, hour_bin)
     if match_conditions:
-        pipeline.append({'$match': match_conditions})
         logger.info(f"Applying match: {match_conditions}")
     
     # Stage 2: Group by H3 index with filtered metrics
-    pipeline.extend([
-        {
-            '$group': {
-                '_id': f'$h3_res_{Config.DEFAULT_H3_RESOLUTION}',
-                'total_orders': {'$sum': 1},
-                'successful_orders': {
-                    '$sum': {'$cond': [{'$eq': ['$order_status', 'success']}, 1, 0]}
-                },
-                'failed_orders': {
-                    '$sum': {'$cond': [{'$ne': ['$order_status', 'success']}, 1, 0]}
-                },
-                'avg_lat': {'$avg': '$pickup_lat'},
-                'avg_lon': {'$avg': '$pickup_lon'},
-                'unique_locations': {
-                    '$addToSet': {
-                        '$concat': [
-                            {'$toString': '$pickup_lat'},
-                            ',',
-                            {'$toString': '$pickup_lon'}
-                        ]
-                    }
-                },
-                'hour_bins': {'$addToSet': '$hour_bin'},
-                'logistics_players': {'$addToSet': '$logistics_player'}
-            }
-        },
-        {
-            '$project': {
-                'h3_index': '$_id',
-                'total_orders': 1,
-                'successful_orders': 1,
-                'failed_orders': 1,
-                'success_rate': {
-                    '$multiply': [
-                        {'$divide': ['$successful_orders', '$total_orders']},
-                        100
-                    ]
-                },
-                'unique_restaurants': {'$size': '$unique_locations'},
-                'center_lat': '$avg_lat',
-                'center_lon': '$avg_lon',
-                'hour_bins': 1,
-                'logistics_players': 1
-            }
-        },
-        {'$sort': {'total_orders': -1}}
-    ])
+    pipeline = hexagons_pipeline(match_conditions)
+    options = covering_index_options(collection, match_conditions)
     
-    results = list(collection.aggregate(pipeline, allowDiskUse=True))
+    results = list(collection.aggregate(pipeline, allowDiskUse=True, **options))
     
     # Convert to GeoJSON
     features = []
@@ -202,52 +162,195 @@ def get_supply_points_with_filters(logistics_player='All', hour_bin='All', limit
         logger.info(f"❌ Cache miss for key: {cache_key} — querying MongoDB")
     
     collection = get_db_collection()
-    pipeline = []
+    match_conditions = build_match_conditions(logistics_player, hour_bin)
+    pipeline = supply_points_pipeline(match_conditions)
+    options = covering_index_options(collection, match_conditions)
     
-    match_conditions = {}
+    results = list(collection.aggregate(pipeline, **options))
+    supply_points = [[r['lat'], r['lon'], r.get('success_rate', 2)] for r in results]
+
+    set_cache(cache_key, supply_points, Config.CACHE_EXPIRY_SECONDS)
+    logger.info(f"Cached result for key: {cache_key}")
+
+    return supply_points
+
+
+def get_supply_clusters_with_filters(logistics_player='All', hour_bin='All', resolution=None):
+    """
+    Cluster supply points into H3 cells: centroid, point count, orders and success rate
+    Resolutions not in H3_RESOLUTIONS are rolled up from the next finer stored resolution
+    """
+    if resolution is None:
+        resolution = Config.DEFAULT_H3_RESOLUTION
+
+    cache_key = f"supply_clusters:{logistics_player}:{hour_bin}:{resolution}"
+    cached = get_cache(cache_key)
+    if cached:
+        logger.info(f"✅ Cache hit for key: {cache_key}")
+        return cached
+    else:
+        logger.info(f"❌ Cache miss for key: {cache_key} — querying MongoDB")
+
+    if resolution in Config.H3_RESOLUTIONS:
+        collection = get_db_collection()
+        match_conditions = build_match_conditions(logistics_player, hour_bin)
+        pipeline = supply_clusters_pipeline(match_conditions, resolution)
+        options = covering_index_options(collection, match_conditions, resolution)
+
+        results = list(collection.aggregate(pipeline, allowDiskUse=True, **options))
+        clusters = [
+            {
+                'h3_index': r['_id'],
+                'lat': round(r['lat'], 6),
+                'lon': round(r['lon'], 6),
+                'supply_points': r['supply_points'],
+                'total_orders': r['total_orders'],
+                'successful_orders': r['successful_orders'],
+                'success_rate': round(r['successful_orders'] / r['total_orders'] * 100, 2)
+            }
+            for r in results
+        ]
+    else:
+        finer = min(res for res in Config.H3_RESOLUTIONS if res > resolution)
+        clusters = rollup_supply_clusters(
+            get_supply_clusters_with_filters(logistics_player, hour_bin, finer), resolution
+        )
+
+    set_cache(cache_key, clusters, Config.CACHE_EXPIRY_SECONDS)
+    logger.info(f"Cached result for key: {cache_key}")
+
+    return clusters
+
+
+def get_supply_demand_with_filters(logistics_player='All', hour_bin='All'):
+    """
+    Get pickup (supply) vs delivery (demand) volume per H3 cell
+    Reads the pre-aggregated cell rollup, never the raw orders
+    """
+    cache_key = f"supply_demand:{logistics_player}:{hour_bin}"
+    cached = get_cache(cache_key)
+    if cached:
+        logger.info(f"✅ Cache hit for key: {cache_key}")
+        return cached
+    else:
+        logger.info(f"❌ Cache miss for key: {cache_key} — querying MongoDB")
+
+    rollup_collection = get_cell_rollup_collection()
+
+    match_conditions = {'resolution': Config.DEFAULT_H3_RESOLUTION}
     if logistics_player != 'All':
         match_conditions['logistics_player'] = logistics_player
     if hour_bin != 'All':
         match_conditions['hour_bin'] = hour_bin
-    
-    if match_conditions:
-        pipeline.append({'$match': match_conditions})
-    
-    pipeline.extend([
+
+    pipeline = [
+        {'$match': match_conditions},
         {
             '$group': {
-                '_id': {
-                    'lat': '$pickup_lat',
-                    'lon': '$pickup_lon'
-                },
-                'total_orders': {'$sum': 1},
-                'successful_orders': {
-                    '$sum': {'$cond': [{'$eq': ['$order_status', 'success']}, 1, 0]}
-                }
+                '_id': '$h3_index',
+                'pickup_orders': {'$sum': '$pickup_orders'},
+                'delivery_orders': {'$sum': '$delivery_orders'}
             }
         },
-        {
-            '$project': {
-                '_id': 0,
-                'lat': '$_id.lat',
-                'lon': '$_id.lon',
-                'success_rate': {
-                    '$multiply': [
-                        {'$divide': ['$successful_orders', '$total_orders']},
-                        100
-                    ]
+        {'$sort': {'delivery_orders': -1}}
+    ]
+
+    results = list(rollup_collection.aggregate(pipeline, allowDiskUse=True))
+
+    features = []
+    for result in results:
+        try:
+            h3_index = result['_id']
+            boundary = h3.cell_to_boundary(h3_index)
+            boundary_coords = [[coord[1], coord[0]] for coord in boundary]
+            center_lat, center_lng = h3.cell_to_latlng(h3_index)
+            pickup_orders = result['pickup_orders']
+            delivery_orders = result['delivery_orders']
+
+            features.append({
+                'type': 'Feature',
+                'geometry': {
+                    'type': 'Polygon',
+                    'coordinates': [boundary_coords]
+                },
+                'properties': {
+                    'h3_index': h3_index,
+                    'pickup_orders': pickup_orders,
+                    'delivery_orders': delivery_orders,
+                    'supply_demand_ratio': round(pickup_orders / delivery_orders, 3) if delivery_orders else None,
+                    'center_lat': round(center_lat, 6),
+                    'center_lng': round(center_lng, 6)
                 }
-            }
-        }
-    ])
-    
-    results = list(collection.aggregate(pipeline))
-    supply_points = [[r['lat'], r['lon'], r.get('success_rate', 2)] for r in results]
+            })
+        except Exception as e:
+            logger.warning(f"Error processing supply/demand cell: {e}")
+            continue
 
-    set_cache(cache_key, supply_points, Config.CACHE_EXPIRY_SECONDS)
+    geojson = {'type': 'FeatureCollection', 'features': features}
+    set_cache(cache_key, geojson, Config.CACHE_EXPIRY_SECONDS)
     logger.info(f"Cached result for key: {cache_key}")
 
-    return supply_points
+    return geojson
+
+
+def get_od_flows_with_filters(logistics_player='All', hour_bin='All', k=None):
+    """
+    Get the top-k origin-destination corridors between H3 cells
+    Reads the heavy-hitters sketch written at ingestion, one indexed range per filter scope
+    """
+    if k is None:
+        k = Config.DEFAULT_OD_TOP_K
+
+    cache_key = f"od_flows:{logistics_player}:{hour_bin}:{k}"
+    cached = get_cache(cache_key)
+    if cached:
+        logger.info(f"✅ Cache hit for key: {cache_key}")
+        return cached
+    else:
+        logger.info(f"❌ Cache miss for key: {cache_key} — querying MongoDB")
+
+    od_collection = get_od_flow_collection()
+    results = od_collection.find({
+        'resolution': Config.OD_H3_RESOLUTION,
+        'logistics_player': logistics_player,
+        'hour_bin': hour_bin
+    }).sort('total_orders', -1).limit(k)
+
+    corridors = []
+    for result in results:
+        pickup_lat, pickup_lng = h3.cell_to_latlng(result['pickup_h3'])
+        delivery_lat, delivery_lng = h3.cell_to_latlng(result['delivery_h3'])
+        # Successes are only counted while the pair is tracked: count - error orders
+        tracked_orders = result['total_orders'] - result['error']
+
+        corridors.append({
+            'pickup_h3': result['pickup_h3'],
+            'delivery_h3': result['delivery_h3'],
+            'pickup_center': [round(pickup_lat, 6), round(pickup_lng, 6)],
+            'delivery_center': [round(delivery_lat, 6), round(delivery_lng, 6)],
+            'total_orders': result['total_orders'],
+            'max_overcount': result['error'],
+            'success_rate': round(result['successful_orders'] / tracked_orders * 100, 2) if tracked_orders else None
+        })
+
+    od_flows = {'resolution': Config.OD_H3_RESOLUTION, 'corridors': corridors}
+    set_cache(cache_key, od_flows, Config.CACHE_EXPIRY_SECONDS)
+    logger.info(f"Cached result for key: {cache_key}")
+
+    return od_flows
+
+def get_filtered_view(logistics_player='All', hour_bin='All', include_supply_points=True):
+    """Hexagons, statistics and (optionally) supply points for one filter combination"""
+    view = {
+        # Get hexagons with FILTERED metrics
+        'hexagons': get_hexagons_with_filters(logistics_player, hour_bin)
+    }
+    if include_supply_points:
+        # Get supply points matching filters
+        view['supply_points'] = get_supply_points_with_filters(logistics_player, hour_bin)
+    # Get statistics matching filters
+    view['stats'] = get_statistics(logistics_player, hour_bin)
+    return view
 @app.context_processor
 def inject_base_vars():
     return dict(base_path=Config.BASE_PATH, base_url=Config.BASE_URL)
@@ -261,12 +364,10 @@ def index():
     stats = get_statistics()
     logistics_players, hour_bins = get_filters()
     initial_hexagons = get_hexagons_with_filters()
-    initial_supply_points = get_supply_points_with_filters()
     
     return render_template(
         'index.html',
         initial_hexagons=initial_hexagons,
-        initial_supply_points=initial_supply_points,
         total_orders=f"{stats['total_orders']:,}",
         total_restaurants=f"{stats['total_restaurants']:,}",
         success_rate=f"{stats['success_rate']:.1f}",
@@ -284,23 +385,99 @@ def filter_hexagons():
         logistics_player = data.get('logistics_player', 'All')
         hour_bin = data.get('hour_bin', 'All')
         
-        # Get hexagons with FILTERED metrics
-        hexagons = get_hexagons_with_filters(logistics_player, hour_bin)
-        
-        # Get supply points matching filters
-        supply_points = get_supply_points_with_filters(logistics_player, hour_bin)
-        
-        # Get statistics matching filters
-        stats = get_statistics(logistics_player, hour_bin)
-        
+        return jsonify(get_filtered_view(logistics_player, hour_bin))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route(f"{Config.BASE_PATH}/filter_hexagons", methods=['GET'])
+def filter_hexagons_cached():
+    """
+    Cacheable GET variant of filter_hexagons (ETag/304, precompressed gzip/brotli bodies)
+    Supply points are left out; the map loads them per viewport from /supply_clusters
+    """
+    try:
+        logistics_player = request.args.get('logistics_player', 'All')
+        hour_bin = request.args.get('hour_bin', 'All')
+
+        return cached_json_response(
+            f"filter_view:{logistics_player}:{hour_bin}",
+            lambda: get_filtered_view(logistics_player, hour_bin, include_supply_points=False)
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route(f"{Config.BASE_PATH}/supply_clusters", methods=['GET'])
+def supply_clusters():
+    """
+    API endpoint for supply points at a map zoom level
+    Returns H3 clusters below SUPPLY_POINT_MIN_ZOOM and individual points from there on,
+    optionally limited to a bbox of south,west,north,east
+    """
+    try:
+        logistics_player = request.args.get('logistics_player', 'All')
+        hour_bin = request.args.get('hour_bin', 'All')
+        try:
+            zoom = int(float(request.args.get('zoom', 12)))
+        except (ValueError, OverflowError):
+            return jsonify({'error': 'zoom must be a number'}), 400
+        bbox = request.args.get('bbox')
+
+        if bbox:
+            try:
+                south, west, north, east = [float(x) for x in bbox.split(',')]
+            except ValueError:
+                return jsonify({'error': 'bbox must be four numbers: south,west,north,east'}), 400
+            in_view = lambda lat, lon: south <= lat <= north and west <= lon <= east
+        else:
+            in_view = lambda lat, lon: True
+
+        if zoom >= Config.SUPPLY_POINT_MIN_ZOOM:
+            points = get_supply_points_with_filters(logistics_player, hour_bin)
+            return jsonify({
+                'mode': 'points',
+                'points': [p for p in points if in_view(p[0], p[1])]
+            })
+
+        resolution = cluster_resolution_for_zoom(zoom)
+        clusters = get_supply_clusters_with_filters(logistics_player, hour_bin, resolution)
         return jsonify({
-            'hexagons': hexagons,
-            'supply_points': supply_points,
-            'stats': stats
+            'mode': 'clusters',
+            'resolution': resolution,
+            'clusters': [c for c in clusters if in_view(c['lat'], c['lon'])]
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route(f"{Config.BASE_PATH}/supply_demand", methods=['POST'])
+def supply_demand():
+    """API endpoint for pickup vs delivery volume and their ratio per hexagon"""
+    try:
+        data = request.get_json()
+        logistics_player = data.get('logistics_player', 'All')
+        hour_bin = data.get('hour_bin', 'All')
+
+        return jsonify(get_supply_demand_with_filters(logistics_player, hour_bin))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route(f"{Config.BASE_PATH}/od_flows", methods=['POST'])
+def od_flows():
+    """API endpoint for the top-k pickup → delivery corridors between hexagons"""
+    try:
+        data = request.get_json()
+        logistics_player = data.get('logistics_player', 'All')
+        hour_bin = data.get('hour_bin', 'All')
+        try:
+            k = int(data.get('k', Config.DEFAULT_OD_TOP_K))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'k must be an integer'}), 400
+        # limit(0) would mean "no limit"; the sketch only tracks OD_SKETCH_CAPACITY flows anyway
+        k = max(1, min(k, Config.OD_SKETCH_CAPACITY))
+
+        return jsonify(get_od_flows_with_filters(logistics_player, hour_bin, k))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/health')
 def health():
     """Health check endpoint"""
@@ -0,0 +1,4 @@
+"""
+Reproducible benchmarks for ingestion, aggregation and API latency
+Run against local MongoDB/Redis only: python -m benchmarks --help
+"""
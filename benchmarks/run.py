@@ -0,0 +1,330 @@
+"""
+Benchmark runner
+1. Generates a synthetic order CSV and measures ingestion rows/sec
+2. Measures cold (empty Redis) and warm latency of the app's aggregation functions
+3. Replays a mix of filter requests against the Flask app at several concurrency levels
+   and reports p50/p95/p99 latency and payload sizes per endpoint
+Only local MongoDB/Redis are allowed; the benchmark uses its own database and Redis DB
+and never reads .env connection settings.
+Usage: python -m benchmarks --orders 200000 --concurrency 1,4,16 --output bench.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.synthetic_orders import generate_orders_csv
+
+LOCAL_HOSTS = {'localhost', '127.0.0.1', '::1'}
+
+
+def positive_int(value):
+    """argparse type for counts that must be at least 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be >= 1, got {value}")
+    return number
+
+
+def concurrency_levels(value):
+    """argparse type for a comma-separated list of positive concurrency levels"""
+    return [positive_int(level) for level in value.split(',')]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def configure_environment(args):
+    """
+    Point Config at the local benchmark stores. Must run before config/app are imported:
+    load_dotenv() does not override variables that are already set.
+    """
+    mongo_host = urlparse(args.mongo_uri).hostname
+    if not args.allow_remote and (mongo_host not in LOCAL_HOSTS or args.redis_host not in LOCAL_HOSTS):
+        sys.exit("Refusing to benchmark against non-local MongoDB/Redis (use --allow-remote to override)")
+
+    os.environ.update({
+        'MONGO_URI': args.mongo_uri,
+        'MONGO_DB_NAME': args.db_name,
+        'MONGO_COLLECTION_NAME': 'orders',
+        'MONGO_CELL_ROLLUP_COLLECTION_NAME': 'orders_cell_rollup',
+        'MONGO_OD_FLOW_COLLECTION_NAME': 'orders_od_flows',
+        'REDIS_HOST': args.redis_host,
+        'REDIS_PORT': str(args.redis_port),
+        'REDIS_DB': str(args.redis_db),
+        'MAX_CHUNKS': str(10 ** 9),
+        'MIN_RECORDS_FOR_SKIP': str(10 ** 12),
+        'BASE_PATH': '',
+        'BASE_URL': '',
+        'GEOJSON_FILE_PATH': os.path.join(tempfile.gettempdir(), 'benchmark-no-geojson.geojson')
+    })
+
+
+def reset_stores():
+    """Drop the benchmark database and flush the benchmark Redis DB"""
+    from pymongo import MongoClient
+    from config import Config
+    from utils.redis_cache import redis_client
+
+    client = MongoClient(Config.MONGO_URI)
+    client.drop_database(Config.MONGO_DB_NAME)
+    client.close()
+    redis_client.flushdb()
+
+
+def bench_ingestion(csv_path, orders):
+    """Run the real CSV ingestion and return rows/sec"""
+    from scripts.ingest_data import ingest_csv_to_mongodb
+    from utils.database import get_db_collection
+
+    started = time.perf_counter()
+    ingest_csv_to_mongodb(csv_path)
+    elapsed = time.perf_counter() - started
+
+    inserted = get_db_collection().count_documents({})
+    return {
+        'csv_rows': orders,
+        'inserted': inserted,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(inserted / elapsed, 1) if elapsed else None
+    }
+
+
+def sample_filters(collection):
+    """A small, realistic set of (logistics_player, hour_bin) filters: busiest player and hour"""
+    top_player = next(collection.aggregate([
+        {'$group': {'_id': '$logistics_player', 'n': {'$sum': 1}}}, {'$sort': {'n': -1}}, {'$limit': 1}
+    ]))['_id']
+    top_hour = next(collection.aggregate([
+        {'$group': {'_id': '$hour_bin', 'n': {'$sum': 1}}}, {'$sort': {'n': -1}}, {'$limit': 1}
+    ]))['_id']
+    return [('All', 'All'), (top_player, 'All'), ('All', top_hour), (top_player, top_hour)]
+
+
+def bench_functions(app_module, filters, repeats):
+    """Cold latency (Redis flushed before the call) and median warm latency per function and filter"""
+    from utils.database import get_statistics
+    from utils.redis_cache import redis_client
+
+    functions = {
+        'get_hexagons_with_filters': app_module.get_hexagons_with_filters,
+        'get_supply_points_with_filters': app_module.get_supply_points_with_filters,
+        'get_statistics': get_statistics
+    }
+
+    results = []
+    for name, function in functions.items():
+        for player, hour_bin in filters:
+            redis_client.flushdb()
+            started = time.perf_counter()
+            function(player, hour_bin)
+            cold = time.perf_counter() - started
+
+            warm = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                function(player, hour_bin)
+                warm.append(time.perf_counter() - started)
+
+            results.append({
+                'function': name,
+                'logistics_player': player,
+                'hour_bin': hour_bin,
+                'cold_ms': round(cold * 1000, 2),
+                'warm_p50_ms': round(percentile(warm, 50) * 1000, 3)
+            })
+    return results
+
+
+def build_request_mix(players, hour_bins, count, seed):
+    """Weighted mix of dashboard requests; unfiltered views and popular filters dominate, like real clicks"""
+    rng = random.Random(seed)
+    player_choices = ['All'] + players
+    player_weights = [3.0] + [1.0 / rank for rank in range(1, len(players) + 1)]
+    hour_choices = ['All'] + hour_bins
+    hour_weights = [3.0] + [0.2] * len(hour_bins)
+    encodings = ['br, gzip', 'gzip', 'identity']
+
+    requests = []
+    for _ in range(count):
+        player = rng.choices(player_choices, player_weights)[0]
+        hour_bin = rng.choices(hour_choices, hour_weights)[0]
+        kind = rng.choices(
+            ['filter_get', 'filter_post', 'supply_clusters', 'supply_demand', 'od_flows'],
+            [5, 1, 4, 1, 1]
+        )[0]
+        filters = {'logistics_player': player, 'hour_bin': hour_bin}
+
+        if kind == 'filter_get':
+            requests.append(('GET /filter_hexagons', 'GET', f"/filter_hexagons?{urlencode(filters)}",
+                             None, rng.choice(encodings)))
+        elif kind == 'filter_post':
+            requests.append(('POST /filter_hexagons', 'POST', '/filter_hexagons', filters, None))
+        elif kind == 'supply_clusters':
+            params = dict(filters, zoom=rng.choice([5, 8, 10, 12, 13, 14, 16]), bbox='12.8,77.4,13.1,77.8')
+            requests.append(('GET /supply_clusters', 'GET', f"/supply_clusters?{urlencode(params)}", None, None))
+        elif kind == 'supply_demand':
+            requests.append(('POST /supply_demand', 'POST', '/supply_demand', filters, None))
+        else:
+            requests.append(('POST /od_flows', 'POST', '/od_flows', dict(filters, k=50), None))
+    return requests
+
+
+def replay(flask_app, requests, concurrency):
+    """
+    Replay requests through the Flask test client (no sockets) from `concurrency` threads
+    Each thread remembers ETags like a browser, so repeated GETs become conditional requests
+    """
+    local = threading.local()
+    samples = defaultdict(list)
+    lock = threading.Lock()
+
+    def send(request):
+        name, method, url, body, encoding = request
+        if not hasattr(local, 'client'):
+            local.client = flask_app.test_client()
+            local.etags = {}
+
+        headers = {}
+        if encoding:
+            headers['Accept-Encoding'] = encoding
+            etag = local.etags.get((url, encoding))
+            if etag:
+                headers['If-None-Match'] = etag
+
+        started = time.perf_counter()
+        if method == 'GET':
+            response = local.client.get(url, headers=headers)
+        else:
+            response = local.client.post(url, json=body, headers=headers)
+        elapsed = time.perf_counter() - started
+
+        if encoding and response.headers.get('ETag'):
+            local.etags[(url, encoding)] = response.headers['ETag']
+
+        with lock:
+            samples[name].append((elapsed, len(response.get_data()), response.status_code))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, requests))
+    wall = time.perf_counter() - started
+
+    endpoints = {}
+    for name, entries in sorted(samples.items()):
+        latencies = [entry[0] * 1000 for entry in entries]
+        sizes = [entry[1] for entry in entries]
+        endpoints[name] = {
+            'requests': len(entries),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'mean_bytes': int(sum(sizes) / len(sizes)),
+            'max_bytes': max(sizes),
+            'not_modified': sum(1 for entry in entries if entry[2] == 304),
+            'errors': sum(1 for entry in entries if entry[2] >= 500)
+        }
+    return {'concurrency': concurrency, 'requests_per_second': round(len(requests) / wall, 1), 'endpoints': endpoints}
+
+
+def wait_for_startup_threads():
+    """app.initialize_app() warms caches in background threads; let them finish before measuring"""
+    for thread in threading.enumerate():
+        if thread is not threading.main_thread() and not thread.daemon:
+            thread.join()
+
+
+def print_report(report):
+    ingestion = report['ingestion']
+    print("\n" + "=" * 80)
+    print("BENCHMARK REPORT")
+    print("=" * 80)
+    print(f"\nIngestion: {ingestion['inserted']:,} rows in {ingestion['seconds']}s "
+          f"({ingestion['rows_per_second']:,} rows/sec)")
+
+    print(f"\n{'function':<32}{'filter':<44}{'cold ms':>10}{'warm ms':>10}")
+    for row in report['functions']:
+        label = f"{row['logistics_player']} | {row['hour_bin']}"
+        print(f"{row['function']:<32}{label[:43]:<44}{row['cold_ms']:>10}{row['warm_p50_ms']:>10}")
+
+    for run in report['replay']:
+        print(f"\nReplay @ concurrency {run['concurrency']} — {run['requests_per_second']} req/s")
+        print(f"{'endpoint':<26}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean KB':>10}{'304s':>7}{'5xx':>6}")
+        for name, stats in run['endpoints'].items():
+            print(f"{name:<26}{stats['requests']:>6}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+                  f"{stats['p99_ms']:>10}{stats['mean_bytes'] / 1024:>10.1f}{stats['not_modified']:>7}{stats['errors']:>6}")
+    print("=" * 80)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, aggregation and API latency on local stores")
+    parser.add_argument('--orders', type=positive_int, default=100000, help="synthetic orders to generate and ingest")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--csv', help="reuse an existing CSV instead of generating one")
+    parser.add_argument('--repeats', type=positive_int, default=5, help="warm calls per function and filter")
+    parser.add_argument('--requests', type=positive_int, default=500, help="requests replayed per concurrency level")
+    parser.add_argument('--concurrency', type=concurrency_levels, default='1,4,16', help="comma-separated replay concurrency levels")
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017')
+    parser.add_argument('--db-name', default='logistics_benchmark')
+    parser.add_argument('--redis-host', default='localhost')
+    parser.add_argument('--redis-port', type=int, default=6379)
+    parser.add_argument('--redis-db', type=int, default=15, help="Redis DB index; flushed by the benchmark")
+    parser.add_argument('--allow-remote', action='store_true', help="permit non-local MongoDB/Redis hosts")
+    parser.add_argument('--output', help="write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    configure_environment(args)
+    reset_stores()
+
+    csv_path = args.csv
+    orders = args.orders
+    if csv_path is None:
+        csv_path = os.path.join(tempfile.gettempdir(), f"benchmark_orders_{args.orders}_{args.seed}.csv")
+        print(f"Generating {args.orders:,} synthetic orders → {csv_path}")
+        orders = generate_orders_csv(csv_path, args.orders, seed=args.seed)
+
+    report = {'ingestion': bench_ingestion(csv_path, orders)}
+
+    # Importing app runs initialize_app() against the freshly ingested benchmark data
+    import app as app_module
+    from utils.database import get_db_collection, get_filters
+    wait_for_startup_threads()
+
+    filters = sample_filters(get_db_collection())
+    report['functions'] = bench_functions(app_module, filters, args.repeats)
+
+    from utils.redis_cache import redis_client
+    players, hour_bins = get_filters()
+    requests = build_request_mix(players, hour_bins, args.requests, args.seed)
+    report['replay'] = []
+    for concurrency in args.concurrency:
+        # Every level starts from empty caches so levels are comparable
+        redis_client.flushdb()
+        report['replay'].append(replay(app_module.app, requests, concurrency))
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Synthetic order generator
+Writes CSVs in the format scripts/ingest_data.py expects (bpp_id, timestamp, pick_up_gps,
+delivery_gps, order_status) with realistic skew: a few logistics players carry most orders,
+volume follows lunch/dinner peaks, cities differ in size and restaurant popularity is Zipfian
+Usage: python -m benchmarks.synthetic_orders out.csv --orders 100000 --seed 42
+"""
+import argparse
+import csv
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# (name, center lat, center lon, relative order volume, spread in km)
+CITIES = [
+    ('Bengaluru', 12.9716, 77.5946, 0.26, 12),
+    ('Delhi', 28.6139, 77.2090, 0.22, 18),
+    ('Mumbai', 19.0760, 72.8777, 0.18, 14),
+    ('Hyderabad', 17.3850, 78.4867, 0.12, 12),
+    ('Chennai', 13.0827, 80.2707, 0.08, 11),
+    ('Pune', 18.5204, 73.8567, 0.07, 9),
+    ('Kolkata', 22.5726, 88.3639, 0.05, 10),
+    ('Jaipur', 26.9124, 75.7873, 0.02, 7)
+]
+
+# Relative order volume per hour of day: quiet nights, lunch and dinner peaks
+HOURLY_WEIGHTS = [
+    0.6, 0.3, 0.15, 0.1, 0.1, 0.2, 0.6, 1.2, 2.0, 2.4, 2.6, 3.2,
+    4.8, 5.2, 3.8, 2.6, 2.4, 2.8, 3.6, 4.6, 5.4, 5.0, 3.2, 1.6
+]
+
+KM_PER_DEGREE = 111.0
+
+
+def _zipf_weights(n, exponent):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _jitter(rng, lat, lon, km, size):
+    """Gaussian offsets around (lat, lon) with the given spread in km"""
+    lats = lat + rng.normal(0, km / KM_PER_DEGREE, size)
+    lons = lon + rng.normal(0, km / (KM_PER_DEGREE * math.cos(math.radians(lat))), size)
+    return lats, lons
+
+
+def generate_orders_csv(path, orders=100000, players=12, restaurants_per_city=4000,
+                        days=28, start_date='2024-01-01', seed=42):
+    """Write a synthetic order CSV and return the number of rows written"""
+    rng = np.random.default_rng(seed)
+
+    player_ids = [f"logistics-{i:02d}.ondc.example/bpp" for i in range(1, players + 1)]
+    player_weights = _zipf_weights(players, 1.1)
+    # Bigger players tend to be more reliable
+    player_success = np.linspace(0.93, 0.72, players)
+    hour_weights = np.array(HOURLY_WEIGHTS) / sum(HOURLY_WEIGHTS)
+    # Deliveries fail more often at peak load
+    hour_success_penalty = (np.array(HOURLY_WEIGHTS) / max(HOURLY_WEIGHTS)) * 0.08
+
+    city_weights = np.array([city[3] for city in CITIES])
+    city_weights = city_weights / city_weights.sum()
+    restaurant_sites = []
+    for _, lat, lon, _, spread in CITIES:
+        lats, lons = _jitter(rng, lat, lon, spread / 2, restaurants_per_city)
+        restaurant_sites.append((np.round(lats, 6), np.round(lons, 6)))
+    restaurant_weights = _zipf_weights(restaurants_per_city, 0.9)
+
+    start = datetime.fromisoformat(start_date)
+    chunk = 50000
+    written = 0
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['bpp_id', 'timestamp', 'pick_up_gps', 'delivery_gps', 'order_status'])
+
+        while written < orders:
+            size = min(chunk, orders - written)
+            city_idx = rng.choice(len(CITIES), size, p=city_weights)
+            restaurant_idx = rng.choice(restaurants_per_city, size, p=restaurant_weights)
+            player_idx = rng.choice(players, size, p=player_weights)
+            hours = rng.choice(24, size, p=hour_weights)
+            day_offsets = rng.integers(0, days, size)
+            seconds = rng.integers(0, 3600, size)
+            delivery_km = rng.gamma(2.0, 1.6, size)
+            bearings = rng.uniform(0, 2 * math.pi, size)
+            success_draw = rng.random(size)
+            # A small share of rows carry unparseable GPS, as the real export does
+            bad_gps = rng.random(size) < 0.002
+
+            for i in range(size):
+                lats, lons = restaurant_sites[city_idx[i]]
+                pickup_lat = lats[restaurant_idx[i]]
+                pickup_lon = lons[restaurant_idx[i]]
+                delivery_lat = pickup_lat + delivery_km[i] * math.cos(bearings[i]) / KM_PER_DEGREE
+                delivery_lon = pickup_lon + delivery_km[i] * math.sin(bearings[i]) / (
+                    KM_PER_DEGREE * math.cos(math.radians(pickup_lat)))
+
+                timestamp = start + timedelta(days=int(day_offsets[i]), hours=int(hours[i]), seconds=int(seconds[i]))
+                success_rate = player_success[player_idx[i]] - hour_success_penalty[hours[i]]
+
+                writer.writerow([
+                    player_ids[player_idx[i]],
+                    timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                    '' if bad_gps[i] else f"{pickup_lat:.6f},{pickup_lon:.6f}",
+                    f"{delivery_lat:.6f},{delivery_lon:.6f}",
+                    'success' if success_draw[i] < success_rate else 'failed'
+                ])
+            written += size
+
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic logistics order CSV")
+    parser.add_argument('path', help="output CSV path")
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--players', type=int, default=12)
+    parser.add_argument('--restaurants-per-city', type=int, default=4000)
+    parser.add_argument('--days', type=int, default=28)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rows = generate_orders_csv(args.path, args.orders, args.players, args.restaurants_per_city, args.days, seed=args.seed)
+    print(f"Wrote {rows:,} orders to {args.path}")
@@ -14,6 +14,9 @@ class Config:
     MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017')
     MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'logistics_db1')
     MONGO_COLLECTION_NAME = os.getenv('MONGO_COLLECTION_NAME', 'logistics_orders')
+    MONGO_CELL_ROLLUP_COLLECTION_NAME = os.getenv('MONGO_CELL_ROLLUP_COLLECTION_NAME', f'{MONGO_COLLECTION_NAME}_cell_rollup')
+    MONGO_OD_FLOW_COLLECTION_NAME = os.getenv('MONGO_OD_FLOW_COLLECTION_NAME', f'{MONGO_COLLECTION_NAME}_od_flows')
+    MONGO_STREAM_BATCH_COLLECTION_NAME = os.getenv('MONGO_STREAM_BATCH_COLLECTION_NAME', f'{MONGO_COLLECTION_NAME}_stream_batches')
 
     FLASK_ENV = os.getenv('FLASK_ENV', 'production')
     FLASK_HOST = os.getenv('FLASK_HOST', '0.0.0.0')
@@ -27,11 +30,23 @@ class Config:
     MAX_CHUNKS = int(os.getenv('MAX_CHUNKS', 55))
     MIN_RECORDS_FOR_SKIP = int(os.getenv('MIN_RECORDS_FOR_SKIP', 200000))
 
+    STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 1000))
+    STREAM_FLUSH_SECONDS = float(os.getenv('STREAM_FLUSH_SECONDS', 5))
+    STREAM_POLL_SECONDS = float(os.getenv('STREAM_POLL_SECONDS', 0.5))
+    STREAM_GENERATION_SECONDS = float(os.getenv('STREAM_GENERATION_SECONDS', 30))
+
     H3_RESOLUTIONS = [int(x) for x in os.getenv('H3_RESOLUTIONS', '6,7,8,9,10').split(',')]
     DEFAULT_H3_RESOLUTION = int(os.getenv('DEFAULT_H3_RESOLUTION', 8))
+    # Resolutions the pickup/delivery rollup is kept at; /supply_demand reads DEFAULT_H3_RESOLUTION
+    ROLLUP_H3_RESOLUTIONS = [int(x) for x in os.getenv('ROLLUP_H3_RESOLUTIONS', str(DEFAULT_H3_RESOLUTION)).split(',')]
+    VERIFY_INDEXES_ON_STARTUP = os.getenv('VERIFY_INDEXES_ON_STARTUP', 'true').lower() == 'true'
+    OD_H3_RESOLUTION = int(os.getenv('OD_H3_RESOLUTION', 7))
+    OD_SKETCH_CAPACITY = int(os.getenv('OD_SKETCH_CAPACITY', 1000))
 
     DEFAULT_HEXAGON_LIMIT = int(os.getenv('DEFAULT_HEXAGON_LIMIT', 3000))
     DEFAULT_SUPPLY_POINT_LIMIT = int(os.getenv('DEFAULT_SUPPLY_POINT_LIMIT', 3000))
+    DEFAULT_OD_TOP_K = int(os.getenv('DEFAULT_OD_TOP_K', 50))
+    SUPPLY_POINT_MIN_ZOOM = int(os.getenv('SUPPLY_POINT_MIN_ZOOM', 16))
 
     GUNICORN_WORKERS = int(os.getenv('GUNICORN_WORKERS', 4))
     GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', 2))
@@ -41,4 +56,5 @@ class Config:
     BASE_URL = os.getenv('BASE_URL', '')
     REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
     REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+    REDIS_DB = int(os.getenv('REDIS_DB', 0))
     CACHE_EXPIRY_SECONDS = int(os.getenv('CACHE_EXPIRY_SECONDS', 3600))
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""
+MongoDB Index Coverage Check
+Explains every aggregation pipeline the app runs against the raw orders collection and flags
+collection scans or document fetches that a covering index should avoid
+Usage: python scripts/check_indexes.py [--create]
+Exits with status 1 when any pipeline is not served by a covering index scan
+"""
+
+import argparse
+import sys
+import os
+
+from pymongo import MongoClient
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from utils.indexes import create_raw_collection_indexes, verify_pipeline_indexes
+
+def check_indexes(create=False):
+    """Print the index check report; returns True when every pipeline is covered"""
+    print("=" * 80)
+    print("MONGODB INDEX COVERAGE CHECK")
+    print("=" * 80)
+
+    client = MongoClient(Config.MONGO_URI)
+    collection = client[Config.MONGO_DB_NAME][Config.MONGO_COLLECTION_NAME]
+
+    try:
+        if create:
+            print("\n🔧 Creating configured indexes...")
+            create_raw_collection_indexes(collection)
+
+        print(f"\nH3 resolutions: {', '.join(map(str, sorted(set(Config.H3_RESOLUTIONS))))}")
+        print(f"Indexes present: {len(collection.index_information())}")
+
+        problems = verify_pipeline_indexes(collection)
+        if problems:
+            print(f"\n⚠️  {len(problems)} pipelines are not covered:")
+            for problem in problems:
+                print(f"   - {problem}")
+            print("\nRun with --create (or re-run scripts/ingest_data.py) to build the missing indexes.")
+        else:
+            print("\n✅ All pipelines use covering index scans")
+        print("=" * 80)
+        return not problems
+    finally:
+        client.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Verify that the app's aggregation pipelines are index-covered")
+    parser.add_argument('--create', action='store_true', help="create the configured indexes before checking")
+    args = parser.parse_args()
+
+    sys.exit(0 if check_indexes(args.create) else 1)
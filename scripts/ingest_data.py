@@ -6,7 +6,7 @@ Usage: python scripts/ingest_data.py
 
 import pandas as pd
 import h3
-from pymongo import MongoClient, ASCENDING
+from pymongo import MongoClient, UpdateOne
 from datetime import datetime
 import sys
 import os
@@ -15,6 +15,10 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import Config
+from utils.redis_cache import bump_data_generation
+from utils.indexes import create_raw_collection_indexes
+from utils.rollups import count_cell_volumes, apply_cell_volumes, create_cell_rollup_indexes
+from utils.od_flows import ODFlowSketches, create_od_flow_indexes
 
 def parse_gps_coordinate(gps_string):
     """Parse GPS coordinate string like '13.014071,77.532051'"""
@@ -31,35 +35,154 @@ def parse_gps_coordinate(gps_string):
         pass
     return None, None
 
+def fill_delivery_cells(collection, docs):
+    """Set the delivery H3 cells stored orders are missing, exactly as transform_chunk would"""
+    updates = []
+    for doc in docs:
+        if not (doc.get('delivery_lat') and doc.get('delivery_lon')):
+            continue
+        missing = {
+            f'delivery_h3_res_{res}': h3.latlng_to_cell(doc['delivery_lat'], doc['delivery_lon'], res)
+            for res in Config.H3_RESOLUTIONS if not doc.get(f'delivery_h3_res_{res}')
+        }
+        if missing:
+            doc.update(missing)
+            updates.append(UpdateOne({'_id': doc['_id']}, {'$set': missing}))
+    if updates:
+        collection.bulk_write(updates, ordered=False)
+
+def backfill_from_stored_orders(collection, rollup_collection=None, od_collection=None):
+    """
+    Build the cell rollup and/or OD flows from orders already in MongoDB (loaded before they existed)
+    Pass only the collections to rebuild; one pass over the stored orders serves both
+    """
+    projection = ['logistics_player', 'hour_bin', 'order_status', 'pickup_lat', 'pickup_lon',
+                  'delivery_lat', 'delivery_lon']
+    for res in Config.H3_RESOLUTIONS:
+        projection += [f'h3_res_{res}', f'delivery_h3_res_{res}']
+
+    total_scanned = 0
+    batch_records = []
+    od_flows = ODFlowSketches()
+
+    if rollup_collection is not None:
+        print(f"📊 Writing pickup/delivery rollup at H3 resolutions {', '.join(map(str, Config.ROLLUP_H3_RESOLUTIONS))}...")
+
+    for doc in collection.find({}, projection, batch_size=Config.BATCH_SIZE):
+        batch_records.append(doc)
+        if len(batch_records) < Config.BATCH_SIZE:
+            continue
+        fill_delivery_cells(collection, batch_records)
+        if rollup_collection is not None:
+            apply_cell_volumes(rollup_collection, count_cell_volumes(batch_records))
+        if od_collection is not None:
+            od_flows.add_orders(batch_records)
+        total_scanned += len(batch_records)
+        batch_records = []
+        print(f"✓ Backfilled {total_scanned:,} stored orders")
+
+    if batch_records:
+        fill_delivery_cells(collection, batch_records)
+        if rollup_collection is not None:
+            apply_cell_volumes(rollup_collection, count_cell_volumes(batch_records))
+        if od_collection is not None:
+            od_flows.add_orders(batch_records)
+        total_scanned += len(batch_records)
+
+    if od_collection is not None:
+        print(f"🔀 Writing top OD flows at H3 resolution {od_flows.resolution} for {len(od_flows.sketches):,} filter scopes...")
+        od_flows.save(od_collection)
+    bump_data_generation()
+    print(f"Backfill complete: {total_scanned:,} orders")
+
 def create_indexes(collection):
     """Create optimized indexes for fast aggregation queries"""
     print("\n🔧 Creating MongoDB indexes for fast aggregation...")
     
-    # Single field indexes
-    collection.create_index([("logistics_player", ASCENDING)], background=True)
-    collection.create_index([("hour_bin", ASCENDING)], background=True)
-    collection.create_index([("order_status", ASCENDING)], background=True)
-    collection.create_index([("h3_res_8", ASCENDING)], background=True)
-    collection.create_index([("pickup_location", "2dsphere")], background=True)
+    # Covering compound indexes for every configured H3 resolution (see utils/indexes.py)
+    create_raw_collection_indexes(collection)
+    
+    print(f"Covering indexes created for H3 resolutions {', '.join(map(str, sorted(set(Config.H3_RESOLUTIONS))))}!")
+
+def transform_chunk(chunk):
+    """Turn a DataFrame of raw order rows into MongoDB documents (shared by CSV and stream ingestion)"""
+    chunk.columns = chunk.columns.str.strip().str.lower()
+    
+    column_mapping = {
+        'bpp_id': 'logistics_player',
+        'timestamp': 'timestamp_raw',
+        'pick_up_gps': 'pickup_gps',
+        'delivery_gps': 'delivery_gps',
+        'order_status': 'order_status'
+    }
+    chunk = chunk.rename(columns=column_mapping)
+    if chunk.empty:
+        return
+    
+    chunk[['pickup_lat', 'pickup_lon']] = chunk['pickup_gps'].apply(
+        lambda x: pd.Series(parse_gps_coordinate(x))
+    )
+    
+    chunk[['delivery_lat', 'delivery_lon']] = chunk['delivery_gps'].apply(
+        lambda x: pd.Series(parse_gps_coordinate(x))
+    )
+    
+    chunk = chunk.dropna(subset=['pickup_lat', 'pickup_lon'])
     
-    # CRITICAL: Compound indexes for fast filtered aggregation
-    collection.create_index([
-        ("logistics_player", ASCENDING),
-        ("h3_res_8", ASCENDING)
-    ], background=True)
+    # Streamed JSON may carry nulls/numbers where the CSV has strings; parse everything as text
+    chunk['timestamp'] = pd.to_datetime(chunk['timestamp_raw'].astype(str), format='mixed', errors='coerce')
+    chunk = chunk.dropna(subset=['timestamp'])
+    if chunk.empty:
+        return
+    
+    chunk['hour'] = chunk['timestamp'].dt.hour
+    chunk['date'] = chunk['timestamp'].dt.date.astype(str)
+    chunk['day_of_week'] = chunk['timestamp'].dt.dayofweek
+    chunk['hour_bin'] = chunk['hour'].apply(lambda x: f"{x:02d}-{(x+1):02d}")
     
-    collection.create_index([
-        ("hour_bin", ASCENDING),
-        ("h3_res_8", ASCENDING)
-    ], background=True)
+    chunk['order_status'] = chunk['order_status'].fillna('').astype(str).str.strip().str.lower()
+    chunk['logistics_player'] = chunk['logistics_player'].fillna('unknown').astype(str)
     
-    collection.create_index([
-        ("logistics_player", ASCENDING),
-        ("hour_bin", ASCENDING),
-        ("h3_res_8", ASCENDING)
-    ], background=True)
+    for res in Config.H3_RESOLUTIONS:
+        chunk[f'h3_res_{res}'] = chunk.apply(
+            lambda row: h3.latlng_to_cell(row['pickup_lat'], row['pickup_lon'], res=res),
+            axis=1
+        )
+        chunk[f'delivery_h3_res_{res}'] = chunk.apply(
+            lambda row: h3.latlng_to_cell(row['delivery_lat'], row['delivery_lon'], res=res)
+            if pd.notna(row['delivery_lat']) and pd.notna(row['delivery_lon']) else None,
+            axis=1
+        )
     
-    print("Optimized indexes created for sub-second aggregation!")
+    for _, row in chunk.iterrows():
+        doc = {
+            'timestamp': row['timestamp'],
+            'date': row['date'],
+            'hour': int(row['hour']),
+            'hour_bin': row['hour_bin'],
+            'day_of_week': int(row['day_of_week']),
+            'pickup_lat': float(row['pickup_lat']),
+            'pickup_lon': float(row['pickup_lon']),
+            'pickup_location': {
+                'type': 'Point',
+                'coordinates': [float(row['pickup_lon']), float(row['pickup_lat'])]
+            },
+            'delivery_lat': float(row['delivery_lat']) if pd.notna(row['delivery_lat']) else None,
+            'delivery_lon': float(row['delivery_lon']) if pd.notna(row['delivery_lon']) else None,
+            'order_status': str(row['order_status']),
+            'logistics_player': str(row['logistics_player']),
+            **{f'h3_res_{res}': str(row[f'h3_res_{res}']) for res in Config.H3_RESOLUTIONS}
+        }
+        
+        if doc['delivery_lat'] and doc['delivery_lon']:
+            doc['delivery_location'] = {
+                'type': 'Point',
+                'coordinates': [doc['delivery_lon'], doc['delivery_lat']]
+            }
+            for res in Config.H3_RESOLUTIONS:
+                doc[f'delivery_h3_res_{res}'] = str(row[f'delivery_h3_res_{res}'])
+        
+        yield doc
 
 def ingest_csv_to_mongodb(csv_path=None, chunk_size=None):
     """Load CSV data into MongoDB"""
@@ -76,6 +199,8 @@ def ingest_csv_to_mongodb(csv_path=None, chunk_size=None):
     client = MongoClient(Config.MONGO_URI)
     db = client[Config.MONGO_DB_NAME]
     collection = db[Config.MONGO_COLLECTION_NAME]
+    rollup_collection = db[Config.MONGO_CELL_ROLLUP_COLLECTION_NAME]
+    od_collection = db[Config.MONGO_OD_FLOW_COLLECTION_NAME]
     
     existing_count = collection.count_documents({})
     print(f"\nExisting records: {existing_count:,}")
@@ -83,6 +208,20 @@ def ingest_csv_to_mongodb(csv_path=None, chunk_size=None):
     if existing_count >= Config.MIN_RECORDS_FOR_SKIP:
         print(f"Detected {existing_count:,} records. Skipping ingestion...")
         create_indexes(collection)
+        create_cell_rollup_indexes(rollup_collection)
+        create_od_flow_indexes(od_collection)
+        rollup_empty = rollup_collection.estimated_document_count() == 0
+        od_empty = od_collection.estimated_document_count() == 0
+        if rollup_empty:
+            print("⚠️  Cell rollup is empty — backfilling it from the stored orders...")
+        if od_empty:
+            print("⚠️  OD flows are empty — backfilling them from the stored orders...")
+        if rollup_empty or od_empty:
+            backfill_from_stored_orders(
+                collection,
+                rollup_collection if rollup_empty else None,
+                od_collection if od_empty else None
+            )
         
         print(f"\nDATABASE SUMMARY:")
         print(f"   Total documents: {collection.count_documents({}):,}")
@@ -114,7 +253,11 @@ def ingest_csv_to_mongodb(csv_path=None, chunk_size=None):
         
         print("🗑️  Dropping collection...")
         collection.drop()
+        rollup_collection.drop()
+        od_collection.drop()
         collection = db[Config.MONGO_COLLECTION_NAME]
+        rollup_collection = db[Config.MONGO_CELL_ROLLUP_COLLECTION_NAME]
+        od_collection = db[Config.MONGO_OD_FLOW_COLLECTION_NAME]
     
     print(f"\n📂 Loading CSV: {csv_path}")
     print(f"⚙️  Chunk size: {chunk_size:,} rows\n")
@@ -122,79 +265,22 @@ def ingest_csv_to_mongodb(csv_path=None, chunk_size=None):
     total_inserted = 0
     total_skipped = 0
     batch_records = []
+    od_flows = ODFlowSketches()
     
     try:
+        # Rollup rows are upserted per batch, so their key index must exist first
+        create_cell_rollup_indexes(rollup_collection)
+
         for chunk_num, chunk in enumerate(pd.read_csv(csv_path, chunksize=chunk_size), 1):
-            chunk.columns = chunk.columns.str.strip().str.lower()
-            
-            column_mapping = {
-                'bpp_id': 'logistics_player',
-                'timestamp': 'timestamp_raw',
-                'pick_up_gps': 'pickup_gps',
-                'delivery_gps': 'delivery_gps',
-                'order_status': 'order_status'
-            }
-            chunk = chunk.rename(columns=column_mapping)
-            
-            chunk[['pickup_lat', 'pickup_lon']] = chunk['pickup_gps'].apply(
-                lambda x: pd.Series(parse_gps_coordinate(x))
-            )
-            
-            chunk[['delivery_lat', 'delivery_lon']] = chunk['delivery_gps'].apply(
-                lambda x: pd.Series(parse_gps_coordinate(x))
-            )
-            
-            chunk = chunk.dropna(subset=['pickup_lat', 'pickup_lon'])
-            
-            chunk['timestamp'] = pd.to_datetime(chunk['timestamp_raw'], format='mixed', errors='coerce')
-            chunk = chunk.dropna(subset=['timestamp'])
-            
-            chunk['hour'] = chunk['timestamp'].dt.hour
-            chunk['date'] = chunk['timestamp'].dt.date.astype(str)
-            chunk['day_of_week'] = chunk['timestamp'].dt.dayofweek
-            chunk['hour_bin'] = chunk['hour'].apply(lambda x: f"{x:02d}-{(x+1):02d}")
-            
-            chunk['order_status'] = chunk['order_status'].str.strip().str.lower()
-            chunk['logistics_player'] = chunk['logistics_player'].fillna('unknown')
-            
-            for res in Config.H3_RESOLUTIONS:
-                chunk[f'h3_res_{res}'] = chunk.apply(
-                    lambda row: h3.latlng_to_cell(row['pickup_lat'], row['pickup_lon'], res=res),
-                    axis=1
-                )
-            
-            for _, row in chunk.iterrows():
-                doc = {
-                    'timestamp': row['timestamp'],
-                    'date': row['date'],
-                    'hour': int(row['hour']),
-                    'hour_bin': row['hour_bin'],
-                    'day_of_week': int(row['day_of_week']),
-                    'pickup_lat': float(row['pickup_lat']),
-                    'pickup_lon': float(row['pickup_lon']),
-                    'pickup_location': {
-                        'type': 'Point',
-                        'coordinates': [float(row['pickup_lon']), float(row['pickup_lat'])]
-                    },
-                    'delivery_lat': float(row['delivery_lat']) if pd.notna(row['delivery_lat']) else None,
-                    'delivery_lon': float(row['delivery_lon']) if pd.notna(row['delivery_lon']) else None,
-                    'order_status': str(row['order_status']),
-                    'logistics_player': str(row['logistics_player']),
-                    **{f'h3_res_{res}': str(row[f'h3_res_{res}']) for res in Config.H3_RESOLUTIONS}
-                }
-                
-                if doc['delivery_lat'] and doc['delivery_lon']:
-                    doc['delivery_location'] = {
-                        'type': 'Point',
-                        'coordinates': [doc['delivery_lon'], doc['delivery_lat']]
-                    }
-                
+            for doc in transform_chunk(chunk):
                 batch_records.append(doc)
                 
                 if len(batch_records) >= Config.BATCH_SIZE:
                     try:
                         collection.insert_many(batch_records, ordered=False)
                         total_inserted += len(batch_records)
+                        apply_cell_volumes(rollup_collection, count_cell_volumes(batch_records))
+                        od_flows.add_orders(batch_records)
                     except Exception as e:
                         print(f"⚠️  Batch insert warning: {e}")
                         total_skipped += len(batch_records)
@@ -210,6 +296,8 @@ def ingest_csv_to_mongodb(csv_path=None, chunk_size=None):
             try:
                 collection.insert_many(batch_records, ordered=False)
                 total_inserted += len(batch_records)
+                apply_cell_volumes(rollup_collection, count_cell_volumes(batch_records))
+                od_flows.add_orders(batch_records)
             except Exception as e:
                 print(f"Final batch warning: {e}")
                 total_skipped += len(batch_records)
@@ -223,6 +311,14 @@ def ingest_csv_to_mongodb(csv_path=None, chunk_size=None):
         
         create_indexes(collection)
 
+        print(f"\n📊 Pickup/delivery rollup: {rollup_collection.estimated_document_count():,} cell groups "
+              f"at H3 resolutions {', '.join(map(str, Config.ROLLUP_H3_RESOLUTIONS))}")
+
+        print(f"🔀 Writing top OD flows at H3 resolution {od_flows.resolution} for {len(od_flows.sketches):,} filter scopes...")
+        create_od_flow_indexes(od_collection)
+        od_flows.save(od_collection)
+        bump_data_generation()
+
         print(f"\nDATABASE SUMMARY:")
         print(f"   Total documents: {collection.count_documents({}):,}")
         print(f"   Unique logistics players: {len(collection.distinct('logistics_player'))}")
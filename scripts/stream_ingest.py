@@ -0,0 +1,283 @@
+"""
+Streaming Order Ingestion - Incremental Micro-Batches
+Tails a JSONL file (or reads stdin) and applies the same transform as the CSV ingestion.
+Each micro-batch updates the raw collection, the cell rollup, the OD flow sketch and the
+affected hexagons:/stats: cache entries in place.
+Orders are tagged with a stream_batch_id and every batch keeps a marker recording which steps
+have been applied until it completes, so a batch interrupted halfway is finished on restart.
+Usage: python scripts/stream_ingest.py orders.jsonl --follow
+       producer | python scripts/stream_ingest.py -
+Each line is one order object with the CSV columns: bpp_id, timestamp, pick_up_gps, delivery_gps, order_status
+"""
+
+import argparse
+import json
+import queue
+import sys
+import os
+import time
+import traceback
+from threading import Thread
+
+import pandas as pd
+from bson import ObjectId
+from pymongo import ASCENDING, MongoClient
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from scripts.ingest_data import transform_chunk, create_indexes
+from utils.rollups import (
+    count_cell_volumes, apply_cell_volumes, rebuild_cell_volumes, create_cell_rollup_indexes,
+    create_delivery_cell_indexes
+)
+from utils.od_flows import ODFlowSketches, create_od_flow_indexes
+from utils.cache_updates import (
+    create_pickup_scope_index, find_existing_pickup_scopes, snapshot_caches_for_batch,
+    update_caches_for_batch, drop_caches_for_batch
+)
+from utils.redis_cache import bump_data_generation
+
+RAW_COLUMNS = ['bpp_id', 'timestamp', 'pick_up_gps', 'delivery_gps', 'order_status']
+_EOF = object()
+
+def read_lines(source, follow, lines):
+    """Push complete lines from source onto the queue; _EOF marks the end of input"""
+    stream = sys.stdin if source == '-' else open(source, 'r', encoding='utf-8')
+    pending = ''
+    try:
+        while True:
+            line = stream.readline()
+            if not line:
+                if follow and source != '-':
+                    time.sleep(Config.STREAM_POLL_SECONDS)
+                    continue
+                break
+            pending += line
+            # A writer may be mid-line when we reach the end of a followed file
+            if pending.endswith('\n'):
+                lines.put(pending)
+                pending = ''
+        if pending:
+            lines.put(pending)
+    finally:
+        lines.put(_EOF)
+        if stream is not sys.stdin:
+            stream.close()
+
+def parse_order(line):
+    """Parse one JSONL order, normalising keys the same way CSV headers are"""
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(record, dict):
+        return None
+    return {str(key).strip().lower(): value for key, value in record.items()}
+
+class StreamIngestor:
+    """Applies micro-batches of raw orders to MongoDB, rollups and caches"""
+
+    def __init__(self, db):
+        self.collection = db[Config.MONGO_COLLECTION_NAME]
+        self.rollup_collection = db[Config.MONGO_CELL_ROLLUP_COLLECTION_NAME]
+        self.od_collection = db[Config.MONGO_OD_FLOW_COLLECTION_NAME]
+        self.batch_collection = db[Config.MONGO_STREAM_BATCH_COLLECTION_NAME]
+
+        create_indexes(self.collection)
+        create_pickup_scope_index(self.collection)
+        self.collection.create_index([("stream_batch_id", ASCENDING)], sparse=True, background=True)
+        create_delivery_cell_indexes(self.collection)
+        create_cell_rollup_indexes(self.rollup_collection)
+        create_od_flow_indexes(self.od_collection)
+
+        self.od_flows = ODFlowSketches()
+        self.od_flows.load(self.od_collection)
+
+        self.total_inserted = 0
+        self.total_skipped = 0
+
+        self.generation_pending = False
+        self.generation_bumped_at = float('-inf')
+
+        self.recover_pending_batches()
+
+    def publish_generation(self, force=False):
+        """
+        Bump the data generation for applied batches, at most every STREAM_GENERATION_SECONDS
+        Each generation invalidates every ETag and precompressed body, so bumping per batch
+        would rebuild them every few seconds and clients would rarely see a 304
+        """
+        if not self.generation_pending:
+            return
+        now = time.monotonic()
+        if force or now - self.generation_bumped_at >= Config.STREAM_GENERATION_SECONDS:
+            bump_data_generation()
+            self.generation_bumped_at = now
+            self.generation_pending = False
+
+    def recover_pending_batches(self):
+        """Finish every batch whose marker shows it was interrupted after (or during) the insert"""
+        for marker in self.batch_collection.find().sort('_id', ASCENDING):
+            recovered = self._recover_batch(marker)
+            print(f"🔁 Recovered interrupted batch {marker['_id']} ({recovered:,} orders)")
+
+    def apply_batch(self, records):
+        """Apply one micro-batch; a failing batch is logged and skipped so the stream keeps running"""
+        inserted_before = self.total_inserted
+        try:
+            self._apply_batch(records)
+        except Exception as e:
+            print(f"⚠️  Batch of {len(records):,} records failed: {e}")
+            traceback.print_exc()
+            if self.total_inserted == inserted_before:
+                self.total_skipped += len(records)
+            try:
+                self.recover_pending_batches()
+            except Exception as e:
+                print(f"⚠️  Recovery failed, retrying on restart: {e}")
+
+    def _apply_batch(self, records):
+        """Transform, insert and fold one micro-batch into every aggregate"""
+        docs = list(transform_chunk(pd.DataFrame(records, columns=RAW_COLUMNS)))
+        self.total_skipped += len(records) - len(docs)
+        if not docs:
+            return
+
+        # Must look before inserting, otherwise every pickup location would already exist
+        existing_pickup_scopes = find_existing_pickup_scopes(self.collection, docs)
+        cache_snapshot = snapshot_caches_for_batch(docs)
+
+        batch_id = ObjectId()
+        for doc in docs:
+            doc['stream_batch_id'] = batch_id
+        self.batch_collection.insert_one({'_id': batch_id, 'orders': len(docs), 'applied': []})
+
+        try:
+            self.collection.insert_many(docs, ordered=False)
+        except Exception as e:
+            print(f"⚠️  Batch insert warning: {e}")
+            # Unordered inserts may land partially; fold in whatever was stored
+            landed = self._recover_batch(self.batch_collection.find_one({'_id': batch_id}))
+            self.total_inserted += landed
+            self.total_skipped += len(docs) - landed
+            return
+        self._mark_applied(batch_id, 'orders')
+        self.total_inserted += len(docs)
+
+        try:
+            apply_cell_volumes(self.rollup_collection, count_cell_volumes(docs))
+            self._mark_applied(batch_id, 'rollup')
+            self.od_flows.add_orders(docs)
+            self.od_flows.save(self.od_collection)
+            self._mark_applied(batch_id, 'od_flows')
+            update_caches_for_batch(docs, existing_pickup_scopes, cache_snapshot)
+        except Exception:
+            # Never leave cached payloads that disagree with the stored orders
+            drop_caches_for_batch(docs)
+            raise
+        self._finish_batch(batch_id)
+
+        print(f"✓ Batch of {len(docs):,} orders applied (Total inserted: {self.total_inserted:,})")
+
+    def _mark_applied(self, batch_id, step):
+        self.batch_collection.update_one({'_id': batch_id}, {'$addToSet': {'applied': step}})
+
+    def _finish_batch(self, batch_id):
+        self.batch_collection.delete_one({'_id': batch_id})
+        self.generation_pending = True
+        self.publish_generation()
+
+    def _recover_batch(self, marker):
+        """
+        Roll a batch forward from the orders stored under its id and return how many there are
+        Rollup rows are recounted from the raw orders, so the step is safe to repeat; cached
+        payloads of the affected filters are dropped since the pre-insert snapshot is gone
+        """
+        batch_id, applied = marker['_id'], set(marker.get('applied', []))
+        docs = list(self.collection.find({'stream_batch_id': batch_id}))
+
+        if docs:
+            if 'rollup' not in applied:
+                rebuild_cell_volumes(self.collection, self.rollup_collection, docs)
+                self._mark_applied(batch_id, 'rollup')
+            if 'od_flows' not in applied:
+                # The in-memory sketch may already hold part of the batch; restart from the saved state
+                self.od_flows = ODFlowSketches()
+                self.od_flows.load(self.od_collection)
+                self.od_flows.add_orders(docs)
+                self.od_flows.save(self.od_collection)
+                self._mark_applied(batch_id, 'od_flows')
+            drop_caches_for_batch(docs)
+
+        self._finish_batch(batch_id)
+        return len(docs)
+
+def stream_to_mongodb(source='-', follow=False, batch_size=None, flush_seconds=None):
+    """Ingest orders from a JSONL source in micro-batches until EOF (or forever when following)"""
+    if batch_size is None:
+        batch_size = Config.STREAM_BATCH_SIZE
+    if flush_seconds is None:
+        flush_seconds = Config.STREAM_FLUSH_SECONDS
+
+    print("=" * 80)
+    print("LOGISTICS STREAM INGESTION TO MONGODB")
+    print("=" * 80)
+    print(f"\n📡 Source: {'stdin' if source == '-' else source}{' (following)' if follow else ''}")
+    print(f"⚙️  Micro-batch: {batch_size:,} orders or {flush_seconds}s\n")
+
+    client = MongoClient(Config.MONGO_URI)
+    ingestor = StreamIngestor(client[Config.MONGO_DB_NAME])
+
+    lines = queue.Queue(maxsize=batch_size * 4)
+    Thread(target=read_lines, args=(source, follow, lines), daemon=True).start()
+
+    batch = []
+    deadline = time.monotonic() + flush_seconds
+    try:
+        while True:
+            try:
+                line = lines.get(timeout=max(deadline - time.monotonic(), 0.01))
+            except queue.Empty:
+                line = None
+
+            if line is _EOF:
+                break
+            if line is not None:
+                record = parse_order(line)
+                if record is None:
+                    ingestor.total_skipped += 1
+                else:
+                    batch.append(record)
+
+            if len(batch) >= batch_size or time.monotonic() >= deadline:
+                if batch:
+                    ingestor.apply_batch(batch)
+                    batch = []
+                ingestor.publish_generation()
+                deadline = time.monotonic() + flush_seconds
+
+        if batch:
+            ingestor.apply_batch(batch)
+
+    except KeyboardInterrupt:
+        print("\nStopping stream...")
+        if batch:
+            ingestor.apply_batch(batch)
+    finally:
+        ingestor.publish_generation(force=True)
+        print(f"\nTotal records inserted: {ingestor.total_inserted:,}")
+        if ingestor.total_skipped > 0:
+            print(f"Records skipped: {ingestor.total_skipped:,}")
+        client.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stream JSONL orders into MongoDB in micro-batches")
+    parser.add_argument('source', nargs='?', default='-', help="JSONL file to read, or '-' for stdin")
+    parser.add_argument('--follow', action='store_true', help="keep tailing the file for new lines")
+    parser.add_argument('--batch-size', type=int, default=None, help="orders per micro-batch")
+    parser.add_argument('--flush-seconds', type=float, default=None, help="max seconds before a partial batch is applied")
+    args = parser.parse_args()
+
+    stream_to_mongodb(args.source, args.follow, args.batch_size, args.flush_seconds)
@@ -0,0 +1,12 @@
+"""
+Shared test setup
+Points MongoDB and Redis at dedicated test databases before config is imported, so the
+integration tests can never touch the dashboard's data
+"""
+import os
+import sys
+
+os.environ['MONGO_DB_NAME'] = os.environ.get('TEST_MONGO_DB_NAME', 'logistics_test')
+os.environ['REDIS_DB'] = os.environ.get('TEST_REDIS_DB', '15')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
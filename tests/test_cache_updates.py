@@ -0,0 +1,144 @@
+import copy
+import random
+from collections import defaultdict
+
+import h3
+import pytest
+
+from config import Config
+from utils.cache_updates import (
+    _order_scopes, _new_locations_by_scope, _batch_deltas, _patch_stats, _patch_hexagons, _scope_of_key
+)
+
+RES = Config.DEFAULT_H3_RESOLUTION
+PLAYERS = ['alpha.example/bpp', 'beta.example/bpp', 'gamma.example/bpp', 'delta.example/bpp']
+HOUR_BINS = ['08-09', '09-10', '12-13', '13-14', '19-20', '20-21', '21-22']
+
+
+def _orders(rng, count, locations):
+    docs = []
+    for _ in range(count):
+        lat, lon = rng.choice(locations)
+        docs.append({
+            'logistics_player': rng.choice(PLAYERS),
+            'hour_bin': rng.choice(HOUR_BINS),
+            'order_status': 'success' if rng.random() < 0.7 else 'failed',
+            'pickup_lat': lat,
+            'pickup_lon': lon,
+            f'h3_res_{RES}': h3.latlng_to_cell(lat, lon, RES)
+        })
+    return docs
+
+
+def _scoped(docs):
+    by_scope = defaultdict(list)
+    for doc in docs:
+        for scope in _order_scopes(doc):
+            by_scope[scope].append(doc)
+    return by_scope
+
+
+def _stats_from_scratch(docs):
+    successes = sum(1 for doc in docs if doc['order_status'] == 'success')
+    return {
+        'total_orders': len(docs),
+        'successful_orders': successes,
+        'success_rate': round(successes / len(docs) * 100, 1),
+        'total_restaurants': len({(doc['pickup_lat'], doc['pickup_lon']) for doc in docs})
+    }
+
+
+def _hexagons_from_scratch(docs):
+    cells = defaultdict(list)
+    for doc in docs:
+        cells[doc[f'h3_res_{RES}']].append(doc)
+
+    features = []
+    for h3_index, cell_docs in cells.items():
+        successes = sum(1 for doc in cell_docs if doc['order_status'] == 'success')
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Polygon', 'coordinates': [[[c[1], c[0]] for c in h3.cell_to_boundary(h3_index)]]},
+            'properties': {
+                'h3_index': h3_index,
+                'total_orders': len(cell_docs),
+                'success_orders': successes,
+                'fail_orders': len(cell_docs) - successes,
+                'success_rate': round(successes / len(cell_docs) * 100, 2),
+                'center_lat': round(sum(doc['pickup_lat'] for doc in cell_docs) / len(cell_docs), 6),
+                'center_lng': round(sum(doc['pickup_lon'] for doc in cell_docs) / len(cell_docs), 6),
+                'unique_restaurants': len({(doc['pickup_lat'], doc['pickup_lon']) for doc in cell_docs}),
+                'hour_bins': ','.join(sorted({doc['hour_bin'] for doc in cell_docs})),
+                'logistics_players': ','.join(sorted({doc['logistics_player'].split('/')[-1] for doc in cell_docs}))
+            }
+        })
+    features.sort(key=lambda f: f['properties']['total_orders'], reverse=True)
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def _existing_pickup_scopes(stored, batch):
+    """What find_existing_pickup_scopes returns for the batch before it is inserted"""
+    coords = {(doc['pickup_lat'], doc['pickup_lon']) for doc in batch}
+    return {
+        (doc['pickup_lat'], doc['pickup_lon'], doc['logistics_player'], doc['hour_bin'])
+        for doc in stored if (doc['pickup_lat'], doc['pickup_lon']) in coords
+    }
+
+
+@pytest.fixture
+def stored_and_batch():
+    rng = random.Random(7)
+    locations = [(round(12.9 + rng.random() * 0.2, 6), round(77.5 + rng.random() * 0.2, 6)) for _ in range(60)]
+    # The batch reuses known pickup locations and brings some new ones
+    batch_locations = rng.sample(locations, 20) + [
+        (round(12.9 + rng.random() * 0.2, 6), round(77.5 + rng.random() * 0.2, 6)) for _ in range(10)
+    ]
+    return _orders(rng, 1500, locations), _orders(rng, 400, batch_locations)
+
+
+def test_patched_stats_match_a_recompute(stored_and_batch):
+    stored, batch = stored_and_batch
+    new_locations = _new_locations_by_scope(batch, _existing_pickup_scopes(stored, batch))
+    stats_deltas, _ = _batch_deltas(batch, new_locations)
+    before, after = _scoped(stored), _scoped(stored + batch)
+
+    # Every (player, hour bin) scope plus the 'All' rows and columns
+    assert len(stats_deltas) == (len(PLAYERS) + 1) * (len(HOUR_BINS) + 1)
+    for scope, delta in stats_deltas.items():
+        patched = _patch_stats(_stats_from_scratch(before[scope]), delta, len(new_locations[scope]))
+        assert patched == _stats_from_scratch(after[scope]), scope
+
+
+def test_patched_hexagons_match_a_recompute(stored_and_batch):
+    stored, batch = stored_and_batch
+    new_locations = _new_locations_by_scope(batch, _existing_pickup_scopes(stored, batch))
+    stats_deltas, cell_deltas = _batch_deltas(batch, new_locations)
+    before, after = _scoped(stored), _scoped(stored + batch)
+
+    for scope in stats_deltas:
+        patched = _patch_hexagons(copy.deepcopy(_hexagons_from_scratch(before[scope])), cell_deltas[scope])
+        expected = _hexagons_from_scratch(after[scope])
+
+        patched_cells = {f['properties']['h3_index']: f for f in patched['features']}
+        expected_cells = {f['properties']['h3_index']: f for f in expected['features']}
+        assert patched_cells.keys() == expected_cells.keys(), scope
+
+        for h3_index, feature in expected_cells.items():
+            got, want = patched_cells[h3_index]['properties'], feature['properties']
+            for field in ('total_orders', 'success_orders', 'fail_orders', 'success_rate',
+                          'unique_restaurants', 'hour_bins'):
+                assert got[field] == want[field], (scope, h3_index, field)
+            assert got['center_lat'] == pytest.approx(want['center_lat'], abs=1e-5)
+            assert got['center_lng'] == pytest.approx(want['center_lng'], abs=1e-5)
+            assert set(got['logistics_players'].split(',')) == set(want['logistics_players'].split(','))
+            assert patched_cells[h3_index]['geometry'] == feature['geometry']
+
+        totals = [f['properties']['total_orders'] for f in patched['features']]
+        assert totals == sorted(totals, reverse=True)
+
+
+def test_scope_of_key_handles_players_containing_colons():
+    assert _scope_of_key('stats:All:09-10') == ('All', '09-10')
+    assert _scope_of_key('hexagons:https://lsp.example/bpp:All:5000') == ('https://lsp.example/bpp', 'All')
+    assert _scope_of_key('supply_demand:p1:20-21') == ('p1', '20-21')
+    assert _scope_of_key('od_flows:All:All:50') == ('All', 'All')
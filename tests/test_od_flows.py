@@ -0,0 +1,121 @@
+import random
+from collections import Counter
+
+import h3
+from pymongo import DeleteOne, ReplaceOne
+
+from utils.od_flows import SpaceSavingSketch, ODFlowSketches, _od_cells
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.operations = []
+
+    def bulk_write(self, operations, ordered=True):
+        self.operations.extend(operations)
+
+
+def _skewed_stream(seed, items=200, length=5000):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(items)]
+    return rng.choices([f"item-{i}" for i in range(items)], weights=weights, k=length)
+
+
+def test_sketch_never_exceeds_capacity():
+    sketch = SpaceSavingSketch(capacity=20)
+    for item in _skewed_stream(seed=1):
+        sketch.update(item)
+    assert len(sketch.counters) == 20
+
+
+def test_sketch_error_bounds_hold_for_tracked_and_untracked_items():
+    stream = _skewed_stream(seed=2)
+    truth = Counter(stream)
+    sketch = SpaceSavingSketch(capacity=25)
+    for item in stream:
+        sketch.update(item)
+
+    for item, (count, error, _) in sketch.counters.items():
+        assert count - error <= truth[item] <= count
+
+    min_count = min(count for count, _, _ in sketch.counters.values())
+    for item, true_count in truth.items():
+        if item not in sketch.counters:
+            assert true_count <= min_count
+
+
+def test_sketch_weighted_updates_match_unit_updates():
+    unit, weighted = SpaceSavingSketch(capacity=50), SpaceSavingSketch(capacity=50)
+    stream = _skewed_stream(seed=3, items=40)
+    for item in stream:
+        unit.update(item, successes=1)
+    for item, count in Counter(stream).items():
+        weighted.update(item, weight=count, successes=count)
+    assert unit.counters == weighted.counters
+
+
+def test_sketch_keeps_heavy_hitters():
+    stream = _skewed_stream(seed=4)
+    sketch = SpaceSavingSketch(capacity=30)
+    for item in stream:
+        sketch.update(item)
+    top = [item for item, _ in Counter(stream).most_common(5)]
+    assert all(item in sketch.counters for item in top)
+
+
+def test_pop_changes_reports_updates_and_evictions_once():
+    sketch = SpaceSavingSketch(capacity=2)
+    sketch.update('a', weight=5)
+    sketch.update('b', weight=3)
+    assert sketch.pop_changes() == ({'a': (5, 0, 0), 'b': (3, 0, 0)}, set())
+
+    sketch.update('c')
+    dirty, evicted = sketch.pop_changes()
+    assert evicted == {'b'}
+    assert dirty == {'c': (4, 3, 0)}
+    assert sketch.pop_changes() == ({}, set())
+
+
+def test_pop_changes_forgets_eviction_of_readmitted_item():
+    sketch = SpaceSavingSketch(capacity=1)
+    sketch.update('a')
+    sketch.update('b')
+    sketch.update('a')
+    dirty, evicted = sketch.pop_changes()
+    assert 'a' not in evicted and 'a' in dirty
+    assert evicted == {'b'}
+
+
+def _order(player, hour_bin, pickup, delivery, status='success'):
+    return {
+        'logistics_player': player, 'hour_bin': hour_bin, 'order_status': status,
+        'pickup_lat': pickup[0], 'pickup_lon': pickup[1],
+        'delivery_lat': delivery[0], 'delivery_lon': delivery[1]
+    }
+
+
+def test_save_upserts_changed_flows_and_deletes_evicted_ones():
+    flows = ODFlowSketches(resolution=7, capacity=1)
+    collection = RecordingCollection()
+    flows.add_orders([_order('p1', '09-10', (12.97, 77.59), (12.93, 77.62))])
+    flows.save(collection)
+
+    assert all(isinstance(op, ReplaceOne) for op in collection.operations)
+    assert len(collection.operations) == 4  # one per scope: (p1, 09-10), (p1, All), (All, 09-10), (All, All)
+    saved = collection.operations[0]._doc
+    assert saved['pickup_h3'] == h3.latlng_to_cell(12.97, 77.59, 7)
+    assert saved['delivery_h3'] == h3.latlng_to_cell(12.93, 77.62, 7)
+    assert saved['total_orders'] == 1 and saved['successful_orders'] == 1
+
+    collection.operations.clear()
+    flows.add_orders([_order('p1', '09-10', (28.61, 77.21), (28.65, 77.23), status='failed')])
+    flows.save(collection)
+    deletes = [op for op in collection.operations if isinstance(op, DeleteOne)]
+    upserts = [op for op in collection.operations if isinstance(op, ReplaceOne)]
+    assert len(deletes) == 4 and len(upserts) == 4
+    assert {op._filter['_id'] for op in deletes}.isdisjoint({op._filter['_id'] for op in upserts})
+
+
+def test_od_cells_skips_orders_without_delivery_location():
+    assert _od_cells({'pickup_lat': 12.9, 'pickup_lon': 77.5, 'delivery_lat': None, 'delivery_lon': None}, 7) == (None, None)
+    assert _od_cells({'pickup_lat': 12.9, 'pickup_lon': 77.5, 'delivery_lat': 0.0, 'delivery_lon': 0.0}, 7) == (None, None)
@@ -0,0 +1,137 @@
+"""
+Stream ingestion against a local MongoDB and Redis (skipped when either is unreachable)
+Uses the test databases configured in conftest.py and wipes them around every test
+"""
+import threading
+
+import pandas as pd
+import pytest
+import redis
+from bson import ObjectId
+from pymongo import MongoClient
+
+from config import Config
+
+RES = Config.DEFAULT_H3_RESOLUTION
+
+
+def _services_available():
+    try:
+        MongoClient(Config.MONGO_URI, serverSelectionTimeoutMS=500).admin.command('ping')
+        redis.Redis(host=Config.REDIS_HOST, port=Config.REDIS_PORT, db=Config.REDIS_DB,
+                    socket_connect_timeout=0.5).ping()
+        return True
+    except Exception:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not _services_available(), reason="needs a local MongoDB and Redis")
+
+
+def _records(count, offset=0):
+    records = []
+    for i in range(offset, offset + count):
+        records.append({
+            'bpp_id': f"lsp-{i % 3}.example/bpp",
+            'timestamp': f"2024-01-0{1 + i % 3} {8 + i % 4:02d}:{i % 60:02d}:00",
+            'pick_up_gps': f"{12.90 + (i % 7) * 0.01:.6f},{77.50 + (i % 5) * 0.01:.6f}",
+            'delivery_gps': f"{12.95 + (i % 4) * 0.01:.6f},{77.55 + (i % 6) * 0.01:.6f}",
+            'order_status': 'success' if i % 4 else 'failed'
+        })
+    return records
+
+
+@pytest.fixture
+def db():
+    from utils.redis_cache import redis_client
+
+    client = MongoClient(Config.MONGO_URI)
+    database = client[Config.MONGO_DB_NAME]
+
+    def wipe():
+        for name in (Config.MONGO_COLLECTION_NAME, Config.MONGO_CELL_ROLLUP_COLLECTION_NAME,
+                     Config.MONGO_OD_FLOW_COLLECTION_NAME, Config.MONGO_STREAM_BATCH_COLLECTION_NAME):
+            database.drop_collection(name)
+        redis_client.flushdb()
+
+    wipe()
+    yield database
+    wipe()
+    client.close()
+
+
+def _rollup_pickup_total(database):
+    rows = database[Config.MONGO_CELL_ROLLUP_COLLECTION_NAME].find({'resolution': RES})
+    return sum(row['pickup_orders'] for row in rows)
+
+
+def test_batches_reach_raw_orders_rollup_and_od_flows(db):
+    from scripts.stream_ingest import StreamIngestor
+
+    ingestor = StreamIngestor(db)
+    ingestor.apply_batch(_records(40))
+    ingestor.apply_batch(_records(40, offset=40))
+
+    assert db[Config.MONGO_COLLECTION_NAME].count_documents({}) == 80
+    assert ingestor.total_inserted == 80
+    assert _rollup_pickup_total(db) == 80
+    od_total = sum(doc['total_orders'] for doc in db[Config.MONGO_OD_FLOW_COLLECTION_NAME].find(
+        {'logistics_player': 'All', 'hour_bin': 'All'}))
+    assert od_total == 80
+    assert db[Config.MONGO_STREAM_BATCH_COLLECTION_NAME].count_documents({}) == 0
+
+
+def test_patched_caches_match_a_fresh_query(db):
+    import app
+    from scripts.stream_ingest import StreamIngestor
+    from utils.database import get_statistics
+    from utils.redis_cache import get_cache, delete_cache, redis_client
+
+    # initialize_app() warms caches in background threads; let them finish before starting clean
+    for thread in threading.enumerate():
+        if thread is not threading.current_thread() and not thread.daemon:
+            thread.join()
+    redis_client.flushdb()
+
+    ingestor = StreamIngestor(db)
+    ingestor.apply_batch(_records(40))
+    get_statistics()
+    app.get_hexagons_with_filters()
+
+    ingestor.apply_batch(_records(40, offset=40))
+    hexagons_key = f"hexagons:All:All:{Config.DEFAULT_HEXAGON_LIMIT}"
+    patched_stats, patched_hexagons = get_cache('stats:All:All'), get_cache(hexagons_key)
+    assert patched_stats['total_orders'] == 80
+
+    delete_cache('stats:All:All', hexagons_key)
+    assert get_statistics() == patched_stats
+    fresh = {f['properties']['h3_index']: f['properties'] for f in app.get_hexagons_with_filters()['features']}
+    patched = {f['properties']['h3_index']: f['properties'] for f in patched_hexagons['features']}
+    assert fresh.keys() == patched.keys()
+    for h3_index, props in fresh.items():
+        assert patched[h3_index]['total_orders'] == props['total_orders']
+        assert patched[h3_index]['unique_restaurants'] == props['unique_restaurants']
+
+
+def test_interrupted_batch_is_finished_on_restart(db):
+    from scripts.ingest_data import transform_chunk
+    from scripts.stream_ingest import StreamIngestor, RAW_COLUMNS
+
+    StreamIngestor(db).apply_batch(_records(30))
+
+    # A batch that crashed right after its insert: orders stored, rollup and OD flows untouched
+    batch_id = ObjectId()
+    docs = list(transform_chunk(pd.DataFrame(_records(20, offset=30), columns=RAW_COLUMNS)))
+    for doc in docs:
+        doc['stream_batch_id'] = batch_id
+    db[Config.MONGO_STREAM_BATCH_COLLECTION_NAME].insert_one({'_id': batch_id, 'orders': len(docs), 'applied': ['orders']})
+    db[Config.MONGO_COLLECTION_NAME].insert_many(docs)
+    assert _rollup_pickup_total(db) == 30
+
+    StreamIngestor(db)
+
+    assert _rollup_pickup_total(db) == 50
+    assert db[Config.MONGO_STREAM_BATCH_COLLECTION_NAME].count_documents({}) == 0
+    od_total = sum(doc['total_orders'] for doc in db[Config.MONGO_OD_FLOW_COLLECTION_NAME].find(
+        {'logistics_player': 'All', 'hour_bin': 'All'}))
+    assert od_total == 50
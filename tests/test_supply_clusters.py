@@ -0,0 +1,80 @@
+import random
+from collections import defaultdict
+
+import h3
+import pytest
+
+from config import Config
+from utils.clusters import cluster_resolution_for_zoom, rollup_supply_clusters
+
+
+def _orders(seed=7, points=300, length=3000):
+    rng = random.Random(seed)
+    # Supply points scattered around Bengaluru, a few orders each
+    supply_points = [(12.97 + rng.uniform(-0.3, 0.3), 77.59 + rng.uniform(-0.3, 0.3)) for _ in range(points)]
+    orders = []
+    for _ in range(length):
+        lat, lon = rng.choice(supply_points)
+        orders.append({'pickup_lat': lat, 'pickup_lon': lon, 'success': rng.random() < 0.8})
+    return orders
+
+
+def _clusters(orders, resolution, stored_resolution=None):
+    """
+    Same grouping as supply_clusters_pipeline: orders into supply points, supply points into cells
+    With stored_resolution, points are grouped by the parent of their stored cell; H3 children are
+    not strictly inside their parent, so that can differ from the point's own cell at resolution
+    """
+    points = defaultdict(lambda: [0, 0])
+    for order in orders:
+        point = (order['pickup_lat'], order['pickup_lon'])
+        points[point][0] += 1
+        points[point][1] += order['success']
+
+    cells = defaultdict(list)
+    for (lat, lon), counts in points.items():
+        if stored_resolution is None:
+            h3_index = h3.latlng_to_cell(lat, lon, resolution)
+        else:
+            h3_index = h3.cell_to_parent(h3.latlng_to_cell(lat, lon, stored_resolution), resolution)
+        cells[h3_index].append((lat, lon, *counts))
+
+    clusters = []
+    for h3_index, members in cells.items():
+        total_orders = sum(m[2] for m in members)
+        successful_orders = sum(m[3] for m in members)
+        clusters.append({
+            'h3_index': h3_index,
+            'lat': round(sum(m[0] for m in members) / len(members), 6),
+            'lon': round(sum(m[1] for m in members) / len(members), 6),
+            'supply_points': len(members),
+            'total_orders': total_orders,
+            'successful_orders': successful_orders,
+            'success_rate': round(successful_orders / total_orders * 100, 2)
+        })
+    return clusters
+
+
+def test_zoom_resolution_is_monotonic_and_in_range():
+    resolutions = [cluster_resolution_for_zoom(zoom) for zoom in range(0, 23)]
+    assert resolutions == sorted(resolutions)
+    assert all(0 <= res <= max(Config.H3_RESOLUTIONS) for res in resolutions)
+    assert cluster_resolution_for_zoom(12) == 7
+    assert cluster_resolution_for_zoom(0) == 0
+    assert cluster_resolution_for_zoom(22) == max(Config.H3_RESOLUTIONS)
+
+
+@pytest.mark.parametrize('finer,coarser', [(8, 6), (6, 4), (6, 0)])
+def test_rollup_matches_direct_clustering(finer, coarser):
+    orders = _orders()
+    rolled_up = {c['h3_index']: c for c in rollup_supply_clusters(_clusters(orders, finer), coarser)}
+    direct = {c['h3_index']: c for c in _clusters(orders, coarser, stored_resolution=finer)}
+
+    assert rolled_up.keys() == direct.keys()
+    for h3_index, expected in direct.items():
+        cluster = rolled_up[h3_index]
+        for field in ('supply_points', 'total_orders', 'successful_orders', 'success_rate'):
+            assert cluster[field] == expected[field]
+        # Child centroids were rounded to 6 places before being combined
+        assert cluster['lat'] == pytest.approx(expected['lat'], abs=2e-6)
+        assert cluster['lon'] == pytest.approx(expected['lon'], abs=2e-6)
@@ -2,11 +2,13 @@
 Utility modules for logistics visualization
 """
 
-from .database import get_db_collection, get_statistics, get_filters
+from .database import get_db_collection, get_cell_rollup_collection, get_od_flow_collection, get_statistics, get_filters
 from .geojson_loader import load_pincode_geojson
 
 __all__ = [
     'get_db_collection',
+    'get_cell_rollup_collection',
+    'get_od_flow_collection',
     'get_statistics',
     'get_filters',
     'load_pincode_geojson'
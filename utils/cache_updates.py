@@ -0,0 +1,246 @@
+"""
+Incremental cache maintenance for streamed order batches
+Cached hexagon and statistics payloads are patched with the batch deltas instead of
+being invalidated, so the dashboard stays fresh without re-running the aggregations
+"""
+import json
+import logging
+from collections import defaultdict
+import h3
+from pymongo import ASCENDING
+from config import Config
+from .redis_cache import get_cache_snapshot, compare_and_update_cache, delete_cache, scan_cache_keys
+from .pipelines import existing_pickup_scopes_pipeline
+from .indexes import index_options
+
+logger = logging.getLogger(__name__)
+
+# Per-filter cache prefixes, and whether a ':<limit|resolution|k>' suffix follows the scope
+_SCOPED_CACHE_PREFIXES = {
+    'stats': False,
+    'hexagons': True,
+    'supply_points': True,
+    'supply_clusters': True,
+    'supply_demand': False,
+    'od_flows': True
+}
+# Patched in place; every other scoped cache is dropped for affected filters only
+_PATCHED_CACHE_PREFIXES = ('stats', 'hexagons')
+
+
+def _order_scopes(doc):
+    """Every (logistics_player, hour_bin) filter combination an order counts towards"""
+    player, hour_bin = doc['logistics_player'], doc['hour_bin']
+    return ((player, hour_bin), (player, 'All'), ('All', hour_bin), ('All', 'All'))
+
+
+# Serves find_existing_pickup_scopes, which runs before every streamed insert
+PICKUP_SCOPE_INDEX_KEYS = [
+    ("pickup_lat", ASCENDING), ("pickup_lon", ASCENDING),
+    ("logistics_player", ASCENDING), ("hour_bin", ASCENDING)
+]
+
+
+def create_pickup_scope_index(collection):
+    """Create the index the stream's pre-insert pickup lookup needs (no-op if it exists)"""
+    collection.create_index(PICKUP_SCOPE_INDEX_KEYS, background=True)
+
+
+def find_existing_pickup_scopes(collection, docs):
+    """
+    Return (lat, lon, logistics_player, hour_bin) combinations already stored for the batch's
+    pickup coordinates. Must run BEFORE the batch is inserted; used to keep restaurant counts exact.
+    Served by PICKUP_SCOPE_INDEX_KEYS (create_pickup_scope_index), not a collection scan.
+    """
+    coords = {(doc['pickup_lat'], doc['pickup_lon']) for doc in docs}
+    if not coords:
+        return set()
+
+    pipeline = existing_pickup_scopes_pipeline({lat for lat, _ in coords}, {lon for _, lon in coords})
+
+    existing = set()
+    for result in collection.aggregate(pipeline, **index_options(collection, PICKUP_SCOPE_INDEX_KEYS)):
+        key = result['_id']
+        if (key['lat'], key['lon']) in coords:
+            existing.add((key['lat'], key['lon'], key['player'], key['hour_bin']))
+    return existing
+
+
+def _new_locations_by_scope(docs, existing):
+    """Pickup coordinates that are new to each filter scope once the batch lands"""
+    seen = defaultdict(set)
+    for lat, lon, player, hour_bin in existing:
+        for scope in ((player, hour_bin), (player, 'All'), ('All', hour_bin), ('All', 'All')):
+            seen[scope].add((lat, lon))
+
+    new_locations = defaultdict(set)
+    for doc in docs:
+        location = (doc['pickup_lat'], doc['pickup_lon'])
+        for scope in _order_scopes(doc):
+            if location not in seen[scope]:
+                new_locations[scope].add(location)
+    return new_locations
+
+
+def _batch_deltas(docs, new_locations):
+    """Per-scope statistic deltas and per-scope, per-cell hexagon deltas"""
+    res = Config.DEFAULT_H3_RESOLUTION
+    stats = defaultdict(lambda: {'orders': 0, 'successes': 0})
+    cells = defaultdict(lambda: defaultdict(lambda: {
+        'orders': 0, 'successes': 0, 'lat_sum': 0.0, 'lon_sum': 0.0,
+        'new_locations': set(), 'hour_bins': set(), 'logistics_players': set()
+    }))
+
+    for doc in docs:
+        success = 1 if doc['order_status'] == 'success' else 0
+        location = (doc['pickup_lat'], doc['pickup_lon'])
+        for scope in _order_scopes(doc):
+            stats[scope]['orders'] += 1
+            stats[scope]['successes'] += success
+
+            cell = cells[scope][doc[f'h3_res_{res}']]
+            cell['orders'] += 1
+            cell['successes'] += success
+            cell['lat_sum'] += doc['pickup_lat']
+            cell['lon_sum'] += doc['pickup_lon']
+            cell['hour_bins'].add(doc['hour_bin'])
+            cell['logistics_players'].add(str(doc['logistics_player']).split('/')[-1])
+            if location in new_locations[scope]:
+                cell['new_locations'].add(location)
+
+    return stats, cells
+
+
+def _patch_stats(cached, delta, new_location_count):
+    cached['total_orders'] += delta['orders']
+    cached['successful_orders'] += delta['successes']
+    cached['total_restaurants'] += new_location_count
+    cached['success_rate'] = round(cached['successful_orders'] / cached['total_orders'] * 100, 1)
+    return cached
+
+
+def _patch_hexagons(cached, cell_deltas):
+    features = {feature['properties']['h3_index']: feature for feature in cached['features']}
+
+    for h3_index, delta in cell_deltas.items():
+        feature = features.get(h3_index)
+        if feature is None:
+            boundary = h3.cell_to_boundary(h3_index)
+            feature = features[h3_index] = {
+                'type': 'Feature',
+                'geometry': {
+                    'type': 'Polygon',
+                    'coordinates': [[[coord[1], coord[0]] for coord in boundary]]
+                },
+                'properties': {
+                    'h3_index': h3_index,
+                    'total_orders': 0,
+                    'success_orders': 0,
+                    'fail_orders': 0,
+                    'success_rate': 0,
+                    'center_lat': 0,
+                    'center_lng': 0,
+                    'unique_restaurants': 0,
+                    'hour_bins': '',
+                    'logistics_players': ''
+                }
+            }
+
+        props = feature['properties']
+        previous_orders = props['total_orders']
+        total_orders = previous_orders + delta['orders']
+        props['center_lat'] = round((props['center_lat'] * previous_orders + delta['lat_sum']) / total_orders, 6)
+        props['center_lng'] = round((props['center_lng'] * previous_orders + delta['lon_sum']) / total_orders, 6)
+        props['total_orders'] = total_orders
+        props['success_orders'] += delta['successes']
+        props['fail_orders'] += delta['orders'] - delta['successes']
+        props['success_rate'] = round(props['success_orders'] / total_orders * 100, 2)
+        props['unique_restaurants'] += len(delta['new_locations'])
+
+        hour_bins = set(filter(None, props['hour_bins'].split(','))) | delta['hour_bins']
+        props['hour_bins'] = ','.join(sorted(hour_bins))
+        players = [p for p in props['logistics_players'].split(',') if p]
+        players.extend(p for p in sorted(delta['logistics_players']) if p not in players)
+        props['logistics_players'] = ','.join(players)
+
+    cached['features'] = sorted(features.values(), key=lambda f: f['properties']['total_orders'], reverse=True)
+    return cached
+
+
+def _batch_scopes(docs):
+    return {scope for doc in docs for scope in _order_scopes(doc)}
+
+
+def _scope_of_key(key):
+    """(logistics_player, hour_bin) of a scoped cache key; hour bins never contain ':', players might"""
+    prefix, _, rest = key.partition(':')
+    parts = rest.rsplit(':', 2 if _SCOPED_CACHE_PREFIXES[prefix] else 1)
+    return (parts[0], parts[1]) if len(parts) >= 2 else None
+
+
+def _cache_keys_by_scope(prefixes, scopes):
+    """Cached keys of the given scopes, found with one SCAN per prefix rather than per scope"""
+    keys = defaultdict(list)
+    for prefix in prefixes:
+        for key in scan_cache_keys(f"{prefix}:*"):
+            scope = _scope_of_key(key)
+            if scope in scopes:
+                keys[scope].append(key)
+    return keys
+
+
+def snapshot_caches_for_batch(docs):
+    """
+    Capture the hexagons:/stats: entries the batch will affect. Must run BEFORE the batch is
+    inserted: only these values are known not to include the batch yet, so only they may be patched.
+    """
+    keys_by_scope = _cache_keys_by_scope(_PATCHED_CACHE_PREFIXES, _batch_scopes(docs))
+    return get_cache_snapshot([key for keys in keys_by_scope.values() for key in keys])
+
+
+def drop_caches_for_batch(docs):
+    """Delete every cached payload of the filters a batch affects (fallback when it cannot be patched)"""
+    keys_by_scope = _cache_keys_by_scope(_SCOPED_CACHE_PREFIXES, _batch_scopes(docs))
+    keys = [key for keys in keys_by_scope.values() for key in keys]
+    delete_cache(*keys)
+    logger.info(f"Stream batch of {len(docs):,} orders: dropped {len(keys)} cache entries")
+
+
+def update_caches_for_batch(docs, existing_pickup_scopes, snapshot):
+    """
+    Apply a freshly inserted batch to every cached payload it affects
+    hexagons:/stats: entries captured in `snapshot` are patched in place if they are unchanged;
+    entries written since (by a cache miss that may already have counted the batch) are dropped,
+    as are other derived caches of the affected filters, which are recomputed from the rollups
+    """
+    if not docs:
+        return
+
+    new_locations = _new_locations_by_scope(docs, existing_pickup_scopes)
+    stats_deltas, cell_deltas = _batch_deltas(docs, new_locations)
+    patched = 0
+    stale_keys = []
+
+    keys_by_scope = _cache_keys_by_scope(_SCOPED_CACHE_PREFIXES, set(stats_deltas))
+
+    for scope, delta in stats_deltas.items():
+        for key in keys_by_scope[scope]:
+            prefix = key.partition(':')[0]
+            before = snapshot.get(key)
+            if prefix not in _PATCHED_CACHE_PREFIXES or before is None:
+                stale_keys.append(key)
+                continue
+
+            cached = json.loads(before)
+            if prefix == 'stats':
+                value = _patch_stats(cached, delta, len(new_locations[scope]))
+            else:
+                value = _patch_hexagons(cached, cell_deltas[scope])
+
+            if compare_and_update_cache(key, before, value):
+                patched += 1
+            else:
+                stale_keys.append(key)
+
+    delete_cache(*stale_keys)
+    logger.info(f"Stream batch of {len(docs):,} orders: patched {patched} cache entries, dropped {len(stale_keys)}")
@@ -0,0 +1,41 @@
+"""
+Supply point clusters for the map: pick an H3 resolution for a zoom level and
+roll clusters up from a finer stored resolution to a coarser one
+"""
+import math
+import h3
+from config import Config
+
+
+def cluster_resolution_for_zoom(zoom):
+    """
+    H3 resolution whose cells are roughly cluster-sized (~60px) at a web map zoom level
+    Zoom 12 maps to res 7; each zoom step halves distances while each resolution step
+    shrinks cells by sqrt(7), so the resolution grows by log(2)/log(sqrt(7)) per zoom level
+    """
+    target = round(7 + (zoom - 12) * math.log(2) / math.log(math.sqrt(7)))
+    # Resolutions without stored cells are rolled up from finer ones, down to res 0 (122 cells)
+    return min(max(target, 0), max(Config.H3_RESOLUTIONS))
+
+
+def rollup_supply_clusters(clusters, resolution):
+    """Merge clusters into their parent cells at a coarser resolution"""
+    parents = {}
+    for cluster in clusters:
+        parent_index = h3.cell_to_parent(cluster['h3_index'], resolution)
+        parent = parents.setdefault(parent_index, {
+            'h3_index': parent_index, 'lat': 0.0, 'lon': 0.0,
+            'supply_points': 0, 'total_orders': 0, 'successful_orders': 0
+        })
+        # Child centroids average their points, so weight them by point count
+        parent['lat'] += cluster['lat'] * cluster['supply_points']
+        parent['lon'] += cluster['lon'] * cluster['supply_points']
+        parent['supply_points'] += cluster['supply_points']
+        parent['total_orders'] += cluster['total_orders']
+        parent['successful_orders'] += cluster['successful_orders']
+
+    for parent in parents.values():
+        parent['lat'] = round(parent['lat'] / parent['supply_points'], 6)
+        parent['lon'] = round(parent['lon'] / parent['supply_points'], 6)
+        parent['success_rate'] = round(parent['successful_orders'] / parent['total_orders'] * 100, 2)
+    return list(parents.values())
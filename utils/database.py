@@ -3,12 +3,16 @@ Database utilities for MongoDB operations
 """
 import logging
 from .redis_cache import get_cache, set_cache
+from .indexes import covering_index_options
+from .pipelines import build_match_conditions, statistics_pipeline
 from pymongo import MongoClient
 from config import Config
 
 _client = None
 _db = None
 _collection = None
+_cell_rollup_collection = None
+_od_flow_collection = None
 logger = logging.getLogger(__name__)
 def get_db_collection():
     """Get MongoDB collection (singleton pattern)"""
@@ -21,6 +25,26 @@ def get_db_collection():
     
     return _collection
 
+def get_cell_rollup_collection():
+    """Get the per-cell pickup/delivery rollup collection (shares the client)"""
+    global _cell_rollup_collection
+
+    if _cell_rollup_collection is None:
+        get_db_collection()
+        _cell_rollup_collection = _db[Config.MONGO_CELL_ROLLUP_COLLECTION_NAME]
+
+    return _cell_rollup_collection
+
+def get_od_flow_collection():
+    """Get the origin-destination flow sketch collection (shares the client)"""
+    global _od_flow_collection
+
+    if _od_flow_collection is None:
+        get_db_collection()
+        _od_flow_collection = _db[Config.MONGO_OD_FLOW_COLLECTION_NAME]
+
+    return _od_flow_collection
+
 def get_statistics(logistics_player='All', hour_bin='All'):
     """Get statistics with filters"""
     cache_key = f"stats:{logistics_player}:{hour_bin}"
@@ -36,54 +60,16 @@ def get_statistics(logistics_player='All', hour_bin='All'):
     
     collection = get_db_collection()
     
-    pipeline = []
-    
-    match_conditions = {}
-    if logistics_player != 'All':
-        match_conditions['logistics_player'] = logistics_player
-    if hour_bin != 'All':
-        match_conditions['hour_bin'] = hour_bin
-    
+    match_conditions = build_match_conditions(logistics_player, hour_bin)
     if match_conditions:
-        pipeline.append({'$match': match_conditions})
         logger.info(f"Applying match conditions: {match_conditions}")
     else:
         logger.info("No match conditions applied — querying all data")
     
-    pipeline.append({
-        '$group': {
-            '_id': None,
-            'total_orders': {'$sum': 1},
-            'successful_orders': {
-                '$sum': {'$cond': [{'$eq': ['$order_status', 'success']}, 1, 0]}
-            },
-            'unique_locations': {
-                '$addToSet': {
-                    '$concat': [
-                        {'$toString': '$pickup_lat'},
-                        ',',
-                        {'$toString': '$pickup_lon'}
-                    ]
-                }
-            }
-        }
-    })
-    
-    pipeline.append({
-        '$project': {
-            'total_orders': 1,
-            'successful_orders': 1,
-            'success_rate': {
-                '$multiply': [
-                    {'$divide': ['$successful_orders', '$total_orders']},
-                    100
-                ]
-            },
-            'total_restaurants': {'$size': '$unique_locations'}
-        }
-    })
+    pipeline = statistics_pipeline(match_conditions)
+    options = covering_index_options(collection, match_conditions)
     
-    results = list(collection.aggregate(pipeline))
+    results = list(collection.aggregate(pipeline, **options))
     
     if results:
         result = results[0]
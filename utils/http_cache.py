@@ -0,0 +1,74 @@
+"""
+HTTP caching for JSON API responses
+Strong ETags come from the cache key and the data generation, so conditional requests are
+answered with 304 without touching Redis payloads or MongoDB. Response bodies are serialized
+and compressed once per generation into a single hash per cache key, which the next generation
+overwrites.
+"""
+import gzip
+import hashlib
+import json
+from flask import Response, request
+from config import Config
+from .redis_cache import get_raw_cache_variant, set_raw_cache_variants, get_data_generation
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+
+def _negotiate_encoding():
+    """Pick the best encoding the client accepts: br, then gzip, then identity"""
+    if brotli is not None and request.accept_encodings['br'] > 0:
+        return 'br'
+    if request.accept_encodings['gzip'] > 0:
+        return 'gzip'
+    return 'identity'
+
+
+def _make_etag(cache_key, generation, encoding):
+    # Strong ETags must differ per representation, so the encoding is part of the tag
+    digest = hashlib.sha1(f"{cache_key}:{generation}".encode('utf-8')).hexdigest()[:24]
+    return f"{digest}-{encoding}"
+
+
+def _encode_variants(payload):
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    variants = {'identity': body, 'gzip': gzip.compress(body, compresslevel=GZIP_LEVEL)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return variants
+
+
+def cached_json_response(cache_key, build_payload):
+    """
+    Serve build_payload() as JSON with ETag/304 support and precompressed bodies
+    build_payload is only called when no stored body exists for the current generation
+    """
+    generation = get_data_generation()
+    encoding = _negotiate_encoding()
+    etag = _make_etag(cache_key, generation, encoding)
+
+    # If-None-Match uses weak comparison (RFC 7232 §3.2); proxies such as nginx gzip weaken ETags
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        body_key = f"http:{cache_key}"
+        body = get_raw_cache_variant(body_key, generation, encoding)
+        if body is None:
+            variants = _encode_variants(build_payload())
+            set_raw_cache_variants(body_key, generation, variants, Config.CACHE_EXPIRY_SECONDS)
+            body = variants[encoding]
+
+        response = Response(body, mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,166 @@
+"""
+Index management for the raw orders collection
+Indexes are derived from Config.H3_RESOLUTIONS so every resolution the app groups by has
+covering compound indexes, and verify_pipeline_indexes() explains the real pipelines to
+catch collection scans and unnecessary document fetches
+"""
+import logging
+import time
+from pymongo import ASCENDING
+from config import Config
+from .pipelines import (
+    build_match_conditions, hexagons_pipeline, supply_points_pipeline,
+    supply_clusters_pipeline, statistics_pipeline
+)
+
+logger = logging.getLogger(__name__)
+
+# Every field the $group stages read, after the filter and H3 prefix
+_COVERED_FIELDS = ('order_status', 'pickup_lat', 'pickup_lon')
+
+# Index list is re-read after this long, so indexes built or dropped by another process
+# (ingestion, check_indexes.py --create) are picked up without restarting the app
+_INDEX_KEYS_TTL_SECONDS = 60
+
+_existing_index_keys = None
+_index_keys_loaded_at = 0.0
+
+
+def covering_index_keys(resolution, hour_bin_first=False):
+    """Compound index covering filtered aggregations at one H3 resolution"""
+    filters = ('hour_bin', 'logistics_player') if hour_bin_first else ('logistics_player', 'hour_bin')
+    fields = filters + (f'h3_res_{resolution}',) + _COVERED_FIELDS
+    return [(field, ASCENDING) for field in fields]
+
+
+def raw_collection_indexes():
+    """All index key patterns the raw orders collection should have"""
+    indexes = [
+        [("order_status", ASCENDING)],
+        [("pickup_location", "2dsphere")],
+    ]
+    for res in sorted(set(Config.H3_RESOLUTIONS)):
+        # Player-first serves player and player+hour filters, hour-first serves hour-only filters
+        indexes.append(covering_index_keys(res))
+        indexes.append(covering_index_keys(res, hour_bin_first=True))
+    return indexes
+
+
+def create_raw_collection_indexes(collection):
+    """Create every configured index (no-op for indexes that already exist)"""
+    global _existing_index_keys
+
+    for keys in raw_collection_indexes():
+        collection.create_index(keys, background=True)
+    _existing_index_keys = None
+
+
+def index_options(collection, keys):
+    """aggregate() options hinting the index with the given keys ({} if it is not built yet)"""
+    global _existing_index_keys, _index_keys_loaded_at
+
+    now = time.monotonic()
+    if _existing_index_keys is None or now - _index_keys_loaded_at >= _INDEX_KEYS_TTL_SECONDS:
+        _existing_index_keys = {
+            tuple((field, direction) for field, direction in info['key'])
+            for info in collection.index_information().values()
+        }
+        _index_keys_loaded_at = now
+
+    return {'hint': keys} if tuple(keys) in _existing_index_keys else {}
+
+
+def covering_index_options(collection, match_conditions, resolution=None):
+    """
+    aggregate() options hinting the covering index for a pipeline ({} if it is not built yet)
+    Unfiltered pipelines would otherwise be planned as a COLLSCAN
+    """
+    if resolution is None:
+        resolution = Config.DEFAULT_H3_RESOLUTION
+
+    hour_bin_first = 'hour_bin' in match_conditions and 'logistics_player' not in match_conditions
+    return index_options(collection, covering_index_keys(resolution, hour_bin_first))
+
+
+def _plan_stages(node, stages):
+    """Collect every stage name in an explain plan tree"""
+    if isinstance(node, dict):
+        if isinstance(node.get('stage'), str):
+            stages.append(node['stage'])
+        for value in node.values():
+            _plan_stages(value, stages)
+    elif isinstance(node, list):
+        for value in node:
+            _plan_stages(value, stages)
+    return stages
+
+
+def _winning_plans(node, plans):
+    """Collect every winningPlan in an explain output (classic and slot-based layouts)"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == 'winningPlan':
+                plans.append(value)
+            else:
+                _winning_plans(value, plans)
+    elif isinstance(node, list):
+        for value in node:
+            _winning_plans(value, plans)
+    return plans
+
+
+def _app_pipelines(collection):
+    """(name, pipeline, hint) for every raw-collection pipeline the app runs"""
+    sample = collection.find_one({}, {'logistics_player': 1, 'hour_bin': 1, 'pickup_lat': 1, 'pickup_lon': 1}) or {}
+    player = sample.get('logistics_player', 'unknown')
+    hour_bin = sample.get('hour_bin', '00-01')
+
+    pipelines = []
+    for filter_player, filter_hour in (('All', 'All'), (player, 'All'), ('All', hour_bin), (player, hour_bin)):
+        match_conditions = build_match_conditions(filter_player, filter_hour)
+        label = f"[{filter_player} | {filter_hour}]"
+        hint = covering_index_options(collection, match_conditions).get('hint')
+        pipelines.append((f"hexagons {label}", hexagons_pipeline(match_conditions), hint))
+        pipelines.append((f"supply_points {label}", supply_points_pipeline(match_conditions), hint))
+        pipelines.append((f"statistics {label}", statistics_pipeline(match_conditions), hint))
+        for res in sorted(set(Config.H3_RESOLUTIONS)):
+            pipelines.append((
+                f"supply_clusters res {res} {label}",
+                supply_clusters_pipeline(match_conditions, res),
+                covering_index_options(collection, match_conditions, res).get('hint')
+            ))
+    return pipelines
+
+
+def verify_pipeline_indexes(collection):
+    """
+    Explain the app's pipelines and return a list of problems: collection scans, document
+    fetches an index could avoid, and pipelines whose covering index is missing
+    """
+    global _existing_index_keys
+    _existing_index_keys = None
+
+    problems = []
+    for name, pipeline, hint in _app_pipelines(collection):
+        command = {'pipeline': pipeline, 'explain': True}
+        if hint:
+            command['hint'] = dict(hint)
+
+        try:
+            explain = collection.database.command('aggregate', collection.name, **command)
+        except Exception as e:
+            problems.append(f"{name}: explain failed — {e}")
+            continue
+
+        stages = []
+        for plan in _winning_plans(explain, []):
+            _plan_stages(plan, stages)
+
+        if 'COLLSCAN' in stages:
+            problems.append(f"{name}: COLLSCAN" + ("" if hint else " (covering index missing)"))
+        elif 'FETCH' in stages:
+            problems.append(f"{name}: FETCH — documents read although an index could cover the pipeline")
+
+    for problem in problems:
+        logger.warning(f"Index check: {problem}")
+    return problems
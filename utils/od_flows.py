@@ -0,0 +1,158 @@
+"""
+Origin-destination flow aggregation between H3 cells
+Flows are tracked with a Space-Saving heavy-hitters sketch per filter scope, so memory
+stays bounded by OD_SKETCH_CAPACITY no matter how many (pickup, delivery) pairs exist
+"""
+import heapq
+import h3
+from pymongo import ASCENDING, DeleteOne, ReplaceOne
+from config import Config
+
+
+class SpaceSavingSketch:
+    """
+    Space-Saving top-k counter (Metwally et al.)
+    Each tracked item keeps [count, error, successes]; count - error orders were seen
+    while the item was tracked, and count never underestimates the true total
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counters = {}
+        self._heap = []
+        self._dirty = set()
+        self._evicted = set()
+
+    def load(self, item, count, error, successes):
+        """Restore a counter previously persisted with pop_changes()"""
+        self.counters[item] = [count, error, successes]
+        heapq.heappush(self._heap, (count, item))
+
+    def update(self, item, weight=1, successes=0):
+        """Add weight occurrences of item, evicting the smallest counter when full"""
+        counter = self.counters.get(item)
+        if counter is None:
+            if len(self.counters) < self.capacity:
+                counter = self.counters[item] = [0, 0, 0]
+            else:
+                min_count, min_item = self._pop_min()
+                del self.counters[min_item]
+                self._dirty.discard(min_item)
+                self._evicted.add(min_item)
+                counter = self.counters[item] = [min_count, min_count, 0]
+            self._evicted.discard(item)
+
+        counter[0] += weight
+        counter[2] += successes
+        self._dirty.add(item)
+        heapq.heappush(self._heap, (counter[0], item))
+
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c[0], i) for i, c in self.counters.items()]
+            heapq.heapify(self._heap)
+
+    def pop_changes(self):
+        """Return (updated items, evicted items) since the last call"""
+        dirty = {item: tuple(self.counters[item]) for item in self._dirty}
+        evicted = set(self._evicted)
+        self._dirty.clear()
+        self._evicted.clear()
+        return dirty, evicted
+
+    def _pop_min(self):
+        # Heap entries go stale when a counter grows; skip those lazily
+        while True:
+            count, item = heapq.heappop(self._heap)
+            counter = self.counters.get(item)
+            if counter is not None and counter[0] == count:
+                return count, item
+
+
+def _od_cells(doc, res):
+    """Pickup and delivery cells of an order at the OD resolution (None if undeliverable)"""
+    # Same test as transform_chunk: a 0/missing coordinate means no delivery location
+    if not (doc.get('delivery_lat') and doc.get('delivery_lon')):
+        return None, None
+
+    pickup_cell = doc.get(f'h3_res_{res}') or h3.latlng_to_cell(doc['pickup_lat'], doc['pickup_lon'], res)
+    delivery_cell = doc.get(f'delivery_h3_res_{res}') or h3.latlng_to_cell(doc['delivery_lat'], doc['delivery_lon'], res)
+    return pickup_cell, delivery_cell
+
+
+class ODFlowSketches:
+    """One Space-Saving sketch per (logistics_player, hour_bin) scope, including 'All'"""
+
+    def __init__(self, resolution=None, capacity=None):
+        self.resolution = Config.OD_H3_RESOLUTION if resolution is None else resolution
+        self.capacity = Config.OD_SKETCH_CAPACITY if capacity is None else capacity
+        self.sketches = {}
+
+    def _sketch(self, scope):
+        sketch = self.sketches.get(scope)
+        if sketch is None:
+            sketch = self.sketches[scope] = SpaceSavingSketch(self.capacity)
+        return sketch
+
+    def add_orders(self, docs):
+        """Count a batch of orders; pairs are pre-aggregated so each scope sees weighted updates"""
+        batch = {}
+        for doc in docs:
+            pickup_cell, delivery_cell = _od_cells(doc, self.resolution)
+            if pickup_cell is None:
+                continue
+
+            success = 1 if doc['order_status'] == 'success' else 0
+            player, hour_bin = doc['logistics_player'], doc['hour_bin']
+            for scope in ((player, hour_bin), (player, 'All'), ('All', hour_bin), ('All', 'All')):
+                counts = batch.setdefault((scope, pickup_cell, delivery_cell), [0, 0])
+                counts[0] += 1
+                counts[1] += success
+
+        for (scope, pickup_cell, delivery_cell), (orders, successes) in batch.items():
+            self._sketch(scope).update((pickup_cell, delivery_cell), orders, successes)
+
+    def load(self, od_collection):
+        """Restore sketch state from the persisted OD flow collection"""
+        for doc in od_collection.find({'resolution': self.resolution}):
+            scope = (doc['logistics_player'], doc['hour_bin'])
+            self._sketch(scope).load(
+                (doc['pickup_h3'], doc['delivery_h3']),
+                doc['total_orders'], doc['error'], doc['successful_orders']
+            )
+
+    def save(self, od_collection):
+        """Persist counters changed since the last save and drop evicted ones"""
+        operations = []
+        for (player, hour_bin), sketch in self.sketches.items():
+            dirty, evicted = sketch.pop_changes()
+            for pickup_cell, delivery_cell in evicted:
+                operations.append(DeleteOne({'_id': self._doc_id(player, hour_bin, pickup_cell, delivery_cell)}))
+            for (pickup_cell, delivery_cell), (count, error, successes) in dirty.items():
+                doc_id = self._doc_id(player, hour_bin, pickup_cell, delivery_cell)
+                operations.append(ReplaceOne({'_id': doc_id}, {
+                    '_id': doc_id,
+                    'resolution': self.resolution,
+                    'logistics_player': player,
+                    'hour_bin': hour_bin,
+                    'pickup_h3': pickup_cell,
+                    'delivery_h3': delivery_cell,
+                    'total_orders': count,
+                    'error': error,
+                    'successful_orders': successes
+                }, upsert=True))
+
+        if operations:
+            od_collection.bulk_write(operations, ordered=True)
+
+    def _doc_id(self, player, hour_bin, pickup_cell, delivery_cell):
+        return f"{self.resolution}:{player}:{hour_bin}:{pickup_cell}:{delivery_cell}"
+
+
+def create_od_flow_indexes(od_collection):
+    """Index serving the top-k corridor query for a scope"""
+    od_collection.create_index([
+        ("resolution", ASCENDING),
+        ("logistics_player", ASCENDING),
+        ("hour_bin", ASCENDING),
+        ("total_orders", -1)
+    ], background=True)
@@ -0,0 +1,201 @@
+"""
+Aggregation pipelines run against the raw orders collection
+Built in one place so the index check explains exactly what the app executes
+"""
+from config import Config
+
+
+def build_match_conditions(logistics_player='All', hour_bin='All'):
+    """$match conditions for the player / hour bin filters ('All' means unfiltered)"""
+    match_conditions = {}
+    if logistics_player != 'All':
+        match_conditions['logistics_player'] = logistics_player
+    if hour_bin != 'All':
+        match_conditions['hour_bin'] = hour_bin
+    return match_conditions
+
+
+def _with_match(match_conditions, stages):
+    return ([{'$match': match_conditions}] if match_conditions else []) + stages
+
+
+def hexagons_pipeline(match_conditions, resolution=None):
+    """Filtered metrics per H3 cell"""
+    if resolution is None:
+        resolution = Config.DEFAULT_H3_RESOLUTION
+
+    return _with_match(match_conditions, [
+        {
+            '$group': {
+                '_id': f'$h3_res_{resolution}',
+                'total_orders': {'$sum': 1},
+                'successful_orders': {
+                    '$sum': {'$cond': [{'$eq': ['$order_status', 'success']}, 1, 0]}
+                },
+                'failed_orders': {
+                    '$sum': {'$cond': [{'$ne': ['$order_status', 'success']}, 1, 0]}
+                },
+                'avg_lat': {'$avg': '$pickup_lat'},
+                'avg_lon': {'$avg': '$pickup_lon'},
+                'unique_locations': {
+                    '$addToSet': {
+                        '$concat': [
+                            {'$toString': '$pickup_lat'},
+                            ',',
+                            {'$toString': '$pickup_lon'}
+                        ]
+                    }
+                },
+                'hour_bins': {'$addToSet': '$hour_bin'},
+                'logistics_players': {'$addToSet': '$logistics_player'}
+            }
+        },
+        {
+            '$project': {
+                'h3_index': '$_id',
+                'total_orders': 1,
+                'successful_orders': 1,
+                'failed_orders': 1,
+                'success_rate': {
+                    '$multiply': [
+                        {'$divide': ['$successful_orders', '$total_orders']},
+                        100
+                    ]
+                },
+                'unique_restaurants': {'$size': '$unique_locations'},
+                'center_lat': '$avg_lat',
+                'center_lon': '$avg_lon',
+                'hour_bins': 1,
+                'logistics_players': 1
+            }
+        },
+        {'$sort': {'total_orders': -1}}
+    ])
+
+
+def supply_points_pipeline(match_conditions):
+    """Success rate per distinct pickup coordinate"""
+    return _with_match(match_conditions, [
+        {
+            '$group': {
+                '_id': {
+                    'lat': '$pickup_lat',
+                    'lon': '$pickup_lon'
+                },
+                'total_orders': {'$sum': 1},
+                'successful_orders': {
+                    '$sum': {'$cond': [{'$eq': ['$order_status', 'success']}, 1, 0]}
+                }
+            }
+        },
+        {
+            '$project': {
+                '_id': 0,
+                'lat': '$_id.lat',
+                'lon': '$_id.lon',
+                'success_rate': {
+                    '$multiply': [
+                        {'$divide': ['$successful_orders', '$total_orders']},
+                        100
+                    ]
+                }
+            }
+        }
+    ])
+
+
+def supply_clusters_pipeline(match_conditions, resolution):
+    """Supply points clustered into H3 cells at the given resolution"""
+    return _with_match(match_conditions, [
+        # Collapse orders into supply points first so the centroid is not order-weighted
+        {
+            '$group': {
+                '_id': {
+                    'h3_index': f'$h3_res_{resolution}',
+                    'lat': '$pickup_lat',
+                    'lon': '$pickup_lon'
+                },
+                'total_orders': {'$sum': 1},
+                'successful_orders': {
+                    '$sum': {'$cond': [{'$eq': ['$order_status', 'success']}, 1, 0]}
+                }
+            }
+        },
+        {
+            '$group': {
+                '_id': '$_id.h3_index',
+                'supply_points': {'$sum': 1},
+                'total_orders': {'$sum': '$total_orders'},
+                'successful_orders': {'$sum': '$successful_orders'},
+                'lat': {'$avg': '$_id.lat'},
+                'lon': {'$avg': '$_id.lon'}
+            }
+        }
+    ])
+
+
+def statistics_pipeline(match_conditions):
+    """Overall order count, success rate and distinct restaurants"""
+    return _with_match(match_conditions, [
+        {
+            '$group': {
+                '_id': None,
+                'total_orders': {'$sum': 1},
+                'successful_orders': {
+                    '$sum': {'$cond': [{'$eq': ['$order_status', 'success']}, 1, 0]}
+                },
+                'unique_locations': {
+                    '$addToSet': {
+                        '$concat': [
+                            {'$toString': '$pickup_lat'},
+                            ',',
+                            {'$toString': '$pickup_lon'}
+                        ]
+                    }
+                }
+            }
+        },
+        {
+            '$project': {
+                'total_orders': 1,
+                'successful_orders': 1,
+                'success_rate': {
+                    '$multiply': [
+                        {'$divide': ['$successful_orders', '$total_orders']},
+                        100
+                    ]
+                },
+                'total_restaurants': {'$size': '$unique_locations'}
+            }
+        }
+    ])
+
+
+def existing_pickup_scopes_pipeline(lats, lons):
+    """Distinct (pickup location, player, hour bin) already stored for candidate coordinates"""
+    return [
+        {'$match': {
+            'pickup_lat': {'$in': list(lats)},
+            'pickup_lon': {'$in': list(lons)}
+        }},
+        {'$group': {'_id': {
+            'lat': '$pickup_lat',
+            'lon': '$pickup_lon',
+            'player': '$logistics_player',
+            'hour_bin': '$hour_bin'
+        }}}
+    ]
+
+def cell_volume_pipeline(cell_field, cells, players, hour_bins):
+    """Order counts per (cell, player, hour bin) for candidate rollup rows"""
+    return [
+        {'$match': {
+            cell_field: {'$in': list(cells)},
+            'logistics_player': {'$in': list(players)},
+            'hour_bin': {'$in': list(hour_bins)}
+        }},
+        {'$group': {
+            '_id': {'h3': f'${cell_field}', 'player': '$logistics_player', 'hour_bin': '$hour_bin'},
+            'orders': {'$sum': 1}
+        }}
+    ]
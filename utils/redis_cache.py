@@ -1,15 +1,26 @@
 import redis
 import json
+import uuid
 from config import Config
 
 # Initialize Redis connection
 redis_client = redis.Redis(
     host=Config.REDIS_HOST,
     port=Config.REDIS_PORT,
-    db=0,
+    db=Config.REDIS_DB,
     decode_responses=True
 )
 
+# Binary-safe connection for precompressed HTTP bodies
+raw_redis_client = redis.Redis(
+    host=Config.REDIS_HOST,
+    port=Config.REDIS_PORT,
+    db=Config.REDIS_DB,
+    decode_responses=False
+)
+
+DATA_GENERATION_KEY = "data:generation"
+
 def set_cache(key, value, expire_seconds=None):
     """Set cache value (JSON serialized)"""
     redis_client.set(key, json.dumps(value), ex=expire_seconds)
@@ -20,3 +31,71 @@ def get_cache(key):
     if cached:
         return json.loads(cached)
     return None
+
+def set_raw_cache_variants(key, version, variants, expire_seconds=None):
+    """Replace the raw byte variants stored under key, tagged with version (older versions are discarded)"""
+    with raw_redis_client.pipeline() as pipe:
+        pipe.delete(key)
+        pipe.hset(key, mapping={'version': version, **variants})
+        if expire_seconds:
+            pipe.expire(key, expire_seconds)
+        pipe.execute()
+
+def get_raw_cache_variant(key, version, variant):
+    """Raw bytes of one variant, or None if missing or stored for another version"""
+    stored_version, body = raw_redis_client.hmget(key, 'version', variant)
+    if stored_version is None or stored_version.decode('utf-8') != version:
+        return None
+    return body
+
+def get_data_generation():
+    """
+    Current data generation, replaced whenever ingested orders change
+    Generations are random rather than a counter, so a flushed Redis never re-issues an old ETag
+    """
+    generation = redis_client.get(DATA_GENERATION_KEY)
+    if generation is None:
+        # First reader after a flush seeds it; concurrent readers all end up with the winner's value
+        redis_client.set(DATA_GENERATION_KEY, uuid.uuid4().hex, nx=True)
+        generation = redis_client.get(DATA_GENERATION_KEY)
+    return generation
+
+def bump_data_generation():
+    """Mark all generation-keyed responses (ETags, compressed bodies) as stale"""
+    generation = uuid.uuid4().hex
+    redis_client.set(DATA_GENERATION_KEY, generation)
+    return generation
+
+def update_cache(key, value):
+    """Overwrite a cached value in place, keeping its remaining expiry"""
+    redis_client.set(key, json.dumps(value), keepttl=True)
+
+def get_cache_snapshot(keys):
+    """Serialized values for keys (None where missing), for compare_and_update_cache"""
+    if not keys:
+        return {}
+    return dict(zip(keys, redis_client.mget(keys)))
+
+def compare_and_update_cache(key, expected, value):
+    """Overwrite a cached value (keeping its expiry) only if it still holds the serialized `expected`"""
+    with redis_client.pipeline() as pipe:
+        try:
+            pipe.watch(key)
+            if pipe.get(key) != expected:
+                pipe.unwatch()
+                return False
+            pipe.multi()
+            pipe.set(key, json.dumps(value), keepttl=True)
+            pipe.execute()
+            return True
+        except redis.WatchError:
+            return False
+
+def delete_cache(*keys):
+    """Delete cache entries"""
+    if keys:
+        redis_client.delete(*keys)
+
+def scan_cache_keys(pattern):
+    """List cache keys matching a glob pattern (non-blocking SCAN)"""
+    return list(redis_client.scan_iter(match=pattern, count=500))
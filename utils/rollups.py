@@ -0,0 +1,117 @@
+"""
+Per-cell rollups maintained at ingestion time
+Pickup (supply) and delivery (demand) volumes are counted per H3 cell, player and hour bin
+so the app never has to group raw orders to compare them
+"""
+from collections import defaultdict
+from pymongo import ASCENDING, UpdateOne
+from config import Config
+from .pipelines import cell_volume_pipeline
+
+
+def count_cell_volumes(docs, resolutions=None):
+    """Count pickup and delivery orders per (resolution, h3_index, logistics_player, hour_bin)"""
+    if resolutions is None:
+        resolutions = Config.ROLLUP_H3_RESOLUTIONS
+
+    counts = defaultdict(lambda: [0, 0])
+    for doc in docs:
+        for res in resolutions:
+            pickup_cell = doc.get(f'h3_res_{res}')
+            if pickup_cell:
+                counts[(res, pickup_cell, doc['logistics_player'], doc['hour_bin'])][0] += 1
+
+            delivery_cell = doc.get(f'delivery_h3_res_{res}')
+            if delivery_cell:
+                counts[(res, delivery_cell, doc['logistics_player'], doc['hour_bin'])][1] += 1
+
+    return counts
+
+
+def apply_cell_volumes(rollup_collection, counts):
+    """Add counted volumes to the rollup collection (upserts, safe to call per batch)"""
+    if not counts:
+        return
+
+    operations = [
+        UpdateOne(
+            {
+                'resolution': res,
+                'h3_index': h3_index,
+                'logistics_player': logistics_player,
+                'hour_bin': hour_bin
+            },
+            {'$inc': {'pickup_orders': pickup_orders, 'delivery_orders': delivery_orders}},
+            upsert=True
+        )
+        for (res, h3_index, logistics_player, hour_bin), (pickup_orders, delivery_orders) in counts.items()
+    ]
+    rollup_collection.bulk_write(operations, ordered=False)
+
+
+def rebuild_cell_volumes(collection, rollup_collection, docs, resolutions=None):
+    """
+    Recount the rollup rows touched by docs straight from the raw collection
+    Unlike apply_cell_volumes this is idempotent, so it can finish a batch whose $inc may or may not have landed
+    """
+    if resolutions is None:
+        resolutions = Config.ROLLUP_H3_RESOLUTIONS
+
+    keys = set(count_cell_volumes(docs, resolutions))
+    if not keys:
+        return
+
+    players = {key[2] for key in keys}
+    hour_bins = {key[3] for key in keys}
+    counts = {key: [0, 0] for key in keys}
+    for res in set(resolutions):
+        cells = {key[1] for key in keys if key[0] == res}
+        for position, cell_field in enumerate((f'h3_res_{res}', f'delivery_h3_res_{res}')):
+            for result in collection.aggregate(cell_volume_pipeline(cell_field, cells, players, hour_bins)):
+                key = (res, result['_id']['h3'], result['_id']['player'], result['_id']['hour_bin'])
+                if key in counts:
+                    counts[key][position] = result['orders']
+
+    operations = [
+        UpdateOne(
+            {
+                'resolution': res,
+                'h3_index': h3_index,
+                'logistics_player': logistics_player,
+                'hour_bin': hour_bin
+            },
+            {'$set': {'pickup_orders': pickup_orders, 'delivery_orders': delivery_orders}},
+            upsert=True
+        )
+        for (res, h3_index, logistics_player, hour_bin), (pickup_orders, delivery_orders) in counts.items()
+    ]
+    rollup_collection.bulk_write(operations, ordered=False)
+
+
+def create_delivery_cell_indexes(collection):
+    """
+    Raw-collection indexes for the delivery pass of rebuild_cell_volumes, one per rollup resolution
+    (the pickup pass is served by the covering indexes in utils/indexes.py)
+    """
+    for res in sorted(set(Config.ROLLUP_H3_RESOLUTIONS)):
+        collection.create_index([
+            ("logistics_player", ASCENDING),
+            ("hour_bin", ASCENDING),
+            (f"delivery_h3_res_{res}", ASCENDING)
+        ], background=True)
+
+
+def create_cell_rollup_indexes(rollup_collection):
+    """Create the unique key index used by upserts and filtered reads"""
+    rollup_collection.create_index([
+        ("resolution", ASCENDING),
+        ("logistics_player", ASCENDING),
+        ("hour_bin", ASCENDING),
+        ("h3_index", ASCENDING)
+    ], unique=True, background=True)
+
+    rollup_collection.create_index([
+        ("resolution", ASCENDING),
+        ("hour_bin", ASCENDING),
+        ("h3_index", ASCENDING)
+    ], background=True)